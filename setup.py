@@ -21,9 +21,9 @@ setup(
     ],
     keywords='healthcare HL7',
     packages=['tidy_hl7_msgs'],
-    python_requires='>=3',
+    python_requires='>=3.7',
     install_requires=[
-        'pandas',
-        'numpy',
+        'pandas>=0.23',
+        'numpy>=1.16',
     ],
 )
@@ -0,0 +1,178 @@
+'''
+Peak memory and retained memory blocks of each stage of tidying, measured
+with tracemalloc on a generated corpus with skewed segment counts
+
+tracemalloc traces memory blocks, not individual allocations, so blocks are
+counted as those still held by a stage when it returns (including its
+result), which shows what a stage keeps alive rather than its churn.
+
+To record baselines for the installed versions of Python, NumPy and pandas:
+
+    $ python -m test.memory
+'''
+
+import gc
+import json
+import os
+import platform
+import tracemalloc
+import numpy as np
+import pandas as pd
+from tidy_hl7_msgs.helpers import (
+    to_cols, join_cols, sort_cols, to_df, join_dfs, zip_msg_ids
+)
+from tidy_hl7_msgs.main import tidy_segs
+from tidy_hl7_msgs.outputs import to_pandas
+from tidy_hl7_msgs.parsers import parse_msgs, parse_msg_id
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'memory_baselines.json')
+
+# measurements may exceed baselines by this share before failing
+THRESHOLD = 0.25
+
+# share allowed if baselines were recorded with other major.minor versions,
+# which allocate differently, so that only blowups fail
+WIDE_THRESHOLD = 1.0
+
+ID_LOCS = ['MSH.7', 'PID.3.1']
+REPORT_LOCS = ['DG1.3.1', 'DG1.3.2', 'DG1.6']
+
+def make_corpus(n_msgs=2000, n_skewed=20, max_segs=200):
+    ''' Messages where a few have many more DG1 segments than the rest
+
+    Parameters
+    ----------
+    n_msgs : int
+    n_skewed : int, number of messages with max_segs DG1 segments
+    max_segs : int
+
+    Returns
+    -------
+    List(string)
+    '''
+    skewed = set(range(0, n_msgs, n_msgs // n_skewed))
+    msgs = []
+    for i in range(n_msgs):
+        n_segs = max_segs if i in skewed else 1 + i % 3
+        msgs.append(
+            "MSH|^~\\&||^Facility|||2017{i:010d}||ADT^A08\n"
+            "PID|1||{i}^^^FACILITY||DOE^JOHN\n".format(i=i)
+            + "".join(
+                "DG1|{n}||D{n}.{i}^Diagnosis {n}^I10|||AM\n".format(n=n + 1, i=i % 97)
+                for n in range(n_segs)
+            )
+        )
+    return msgs
+
+def get_stages(msgs):
+    ''' Stages to measure, each a function of no arguments
+
+    Stages are those run by tidy_segs, in order (joining columns only
+    collects them, so it is not measured), and the public dataframe
+    helpers to_df and join_dfs. Inputs of each stage are prepared here, as
+    tidy_segs prepares them, so they are not measured.
+    '''
+    msg_ids = parse_msg_id(ID_LOCS, msgs)
+    vals_per_loc = [parse_msgs(loc_txt, msgs) for loc_txt in REPORT_LOCS]
+    zipped = [zip_msg_ids(vals, msg_ids) for vals in vals_per_loc]
+
+    joined = join_cols(list(map(to_cols, zipped, REPORT_LOCS)))
+    joined['seg'] = [float(seg) for seg in joined['seg']]
+    sorted_cols = sort_cols(joined, ['msg_id', 'seg'])
+
+    dfs = list(map(to_df, zipped, REPORT_LOCS))
+
+    return {
+        'parse_msgs': lambda: parse_msgs(REPORT_LOCS[0], msgs),
+        'to_cols': lambda: to_cols(zipped[0], REPORT_LOCS[0]),
+        'sort_cols': lambda: sort_cols(joined, ['msg_id', 'seg']),
+        'to_pandas': lambda: to_pandas(sorted_cols),
+        'to_df': lambda: to_df(zipped[0], REPORT_LOCS[0]),
+        'join_dfs': lambda: join_dfs(list(dfs)),
+        'tidy_segs': lambda: tidy_segs(ID_LOCS, REPORT_LOCS, msgs),
+    }
+
+def measure(stage):
+    ''' Peak memory and allocations of a stage
+
+    Parameters
+    ----------
+    stage : function of no arguments
+
+    Returns
+    -------
+    Dict of 'peak' (bytes allocated at the peak) and 'retained_blocks'
+    (memory blocks still allocated by the stage when it returns, including
+    its result)
+    '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = stage()
+        peak = tracemalloc.get_traced_memory()[1]
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    del result
+    return {'peak': peak, 'retained_blocks': blocks}
+
+def get_versions():
+    ''' Major and minor versions that allocations depend on '''
+    return {
+        name: ".".join(version.split(".")[:2])
+        for name, version in [
+            ('python', platform.python_version()),
+            ('numpy', np.__version__),
+            ('pandas', pd.__version__),
+        ]
+    }
+
+def get_threshold(baselines):
+    ''' Threshold of regressions against baselines, wider if they were
+    recorded with other versions '''
+    return THRESHOLD if baselines['versions'] == get_versions() else WIDE_THRESHOLD
+
+def read_baselines():
+    ''' Stored baselines, or None if there are none '''
+    if not os.path.exists(BASELINES):
+        return None
+    with open(BASELINES) as file:
+        return json.load(file)
+
+def write_baselines():
+    ''' Measure each stage and store the measurements as baselines '''
+    stages = get_stages(make_corpus())
+    baselines = {
+        'versions': get_versions(),
+        'stages': {name: measure(stage) for name, stage in stages.items()},
+    }
+    with open(BASELINES, 'w') as file:
+        json.dump(baselines, file, indent=4, sort_keys=True)
+        file.write('\n')
+    return baselines
+
+def find_regressions(measured, baseline, threshold=THRESHOLD):
+    ''' Measurements exceeding their baseline by more than the threshold
+
+    Returns
+    -------
+    List(string) describing each regression
+
+    Examples
+    --------
+    >>> find_regressions({'peak': 130}, {'peak': 100})
+    ['peak: 130 > 100 (+30%)']
+    '''
+    return [
+        "{key}: {val} > {base} (+{pct:.0f}%)".format(
+            key=key, val=measured[key], base=baseline[key],
+            pct=100 * (measured[key] / baseline[key] - 1)
+        )
+        for key in sorted(baseline)
+        if measured[key] > baseline[key] * (1 + threshold)
+    ]
+
+if __name__ == '__main__':
+    for name, stats in write_baselines()['stages'].items():
+        print(name, stats)
+    print("Baselines written to", BASELINES)
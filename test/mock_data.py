@@ -22,3 +22,15 @@ MSG_3 = '''
 '''.lstrip()
 
 MSGS = [MSG_1, MSG_2, MSG_3]
+
+MSG_ORU = '''
+    MSH|^~\\&||^Facility D|||20170801090000||ORU^R01^ORU R01
+    PID|1||321^^^FACILITY D||GREEN^ANN
+    OBX|1|ST|0000-0^Orphan result||X
+    OBR|1|||80048^Basic metabolic panel
+    OBX|1|NM|2345-7^Glucose||98|mg/dL
+    OBX|2|NM|2160-0^Creatinine||1.1|mg/dL
+    OBR|2|||85025^Complete blood count
+    OBR|3|||80061^Lipid panel
+    OBX|3|NM|2093-3^Cholesterol||180|mg/dL
+'''.lstrip()
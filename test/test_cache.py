@@ -0,0 +1,49 @@
+# pylint: disable=missing-docstring, invalid-name
+
+from test.mock_data import MSGS
+from test.test_scanner import LOCS
+import os
+from tidy_hl7_msgs.cache import CachedBatch, get_loc_key
+from tidy_hl7_msgs.main import tidy_segs
+from tidy_hl7_msgs.parsers import parse_msgs, parse_loc_txt
+
+def write_msgs(tmp_path, msgs):
+    path = tmp_path / 'msgs.hl7'
+    path.write_text('header\n' + ''.join(msgs))
+    return str(path)
+
+def test_parse_matches_python_engine(tmp_path):
+    path = write_msgs(tmp_path, MSGS + [MSGS[0]])
+    batch = CachedBatch(path, str(tmp_path / 'cache'))
+    assert len(batch) == len(MSGS)
+    assert list(batch) == MSGS
+    for loc in LOCS:
+        assert parse_msgs(loc, batch) == parse_msgs(loc, MSGS)
+
+def test_cached_locs_reused(tmp_path):
+    path = write_msgs(tmp_path, MSGS)
+    cache_dir = str(tmp_path / 'cache')
+    loc = parse_loc_txt('DG1.3.1')
+
+    batch = CachedBatch(path, cache_dir)
+    batch.parse(loc)
+    loc_path = os.path.join(batch.dir, get_loc_key(loc) + '.npy')
+    assert os.path.exists(loc_path)
+
+    # cached location is loaded without scanning the messages
+    batch = CachedBatch(path, cache_dir)
+    assert batch.parse(loc) == parse_msgs('DG1.3.1', MSGS)
+    assert batch._batch is None # pylint: disable=protected-access
+
+    # changed file gets a new cache entry
+    write_msgs(tmp_path, MSGS[:1])
+    assert CachedBatch(path, cache_dir).dir != batch.dir
+
+def test_tidy_segs_cached(tmp_path):
+    path = write_msgs(tmp_path, MSGS)
+    cache_dir = str(tmp_path / 'cache')
+    id_locs, report_locs = ['MSH.7', 'PID.3.1'], ['DG1.3.1', 'DG1.6']
+    expected = tidy_segs(id_locs, report_locs, MSGS)
+    for _ in range(2):
+        df = tidy_segs(id_locs, report_locs, CachedBatch(path, cache_dir))
+        assert df.equals(expected)
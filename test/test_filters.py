@@ -0,0 +1,48 @@
+# pylint: disable=missing-docstring, invalid-name
+
+from test.mock_data import MSGS, MSG_1, MSG_2, MSG_3
+import pytest
+from tidy_hl7_msgs.filters import prefix, get_predicate, filter_msgs
+from tidy_hl7_msgs.parsers import parse_msgs, parse_loc_txt
+from tidy_hl7_msgs.scanner import MsgBatch, BatchView
+
+def test_get_predicate():
+    assert get_predicate('ADT^A08')('ADT^A08') is True
+    assert get_predicate('ADT^A08')('ADT^A01') is False
+    assert get_predicate({'a', 'b'})('b') is True
+    assert get_predicate(['a', 'b'])('c') is False
+    assert get_predicate(prefix('2017'))('20170515104040') is True
+    assert get_predicate(prefix('2018'))('20170515104040') is False
+
+    with pytest.raises(ValueError):
+        get_predicate(2017)
+
+def test_filter_msgs():
+    for engine in ['python', 'numpy']:
+        assert filter_msgs({'MSH.4.2': 'Facility B'}, MSGS, engine) == [MSG_2]
+        assert filter_msgs({'MSH.4.2': {'Facility A', 'Facility C'}}, MSGS, engine) == (
+            [MSG_1, MSG_3]
+        )
+        assert filter_msgs(
+            {'MSH.9.2': 'A08', 'MSH.7': prefix('201705')}, MSGS, engine
+        ) == [MSG_1]
+
+        # missing segments and values never match
+        assert filter_msgs({'EVN.2': prefix('')}, MSGS, engine) == []
+        assert filter_msgs({'PID.3.2': prefix('')}, MSGS, engine) == []
+
+def test_filter_batch():
+    batch = MsgBatch(MSGS)
+    view = filter_msgs({'MSH.4.2': {'Facility A', 'Facility C'}}, batch)
+    assert isinstance(view, BatchView) and view.batch is batch
+    assert list(view) == [MSG_1, MSG_3]
+    assert view.get_seps() == ['|^', '|^']
+    assert view.parse(parse_loc_txt('DG1.3.1')) == parse_msgs('DG1.3.1', [MSG_1, MSG_3])
+    assert view.parse_segs(['DG1']) == MsgBatch([MSG_1, MSG_3]).parse_segs(['DG1'])
+
+    # values are located for messages of the view only
+    assert view.locate(parse_loc_txt('MSH.7'))[0].tolist() == [0, 1]
+
+    # views are batches, and filter further
+    assert list(filter_msgs({'MSH.4.2': 'Facility C'}, view)) == [MSG_3]
+    assert not filter_msgs({'MSH.4.2': 'Facility B'}, view)
@@ -0,0 +1,38 @@
+# pylint: disable=missing-docstring, invalid-name
+
+from test.mock_data import MSGS, MSG_ORU
+import numpy as np
+from tidy_hl7_msgs.groups import group_children, parse_groups
+
+def test_group_children():
+    groups = group_children('OBR', [
+        ('OBX', 'OBX|0'),
+        ('OBR', 'OBR|1'), ('OBX', 'OBX|1'), ('OBX', 'OBX|2'),
+        ('OBR', 'OBR|2'),
+    ])
+    assert groups[1:3] == [(1, 'OBR|1', 2, 'OBX|1'), (1, 'OBR|1', 3, 'OBX|2')]
+
+    # child before any parent
+    assert np.isnan(groups[0][0]) and groups[0][1] is None and groups[0][2:] == (1, 'OBX|0')
+
+    # parent without children
+    assert groups[3][:2] == (2, 'OBR|2') and np.isnan(groups[3][2]) and groups[3][3] is None
+
+    assert group_children('OBR', []) == []
+
+def test_parse_groups():
+    locs = ['OBR.4.1', 'OBX.3.1', 'OBX.5']
+    msgs = [MSG_ORU] + MSGS
+    for engine in ['python', 'numpy', 'parallel']:
+        rows = parse_groups('OBR', locs, msgs, engine)
+        assert rows[0][1:3] == [
+            [1, 2, '80048', '2345-7', '98'],
+            [1, 3, '80048', '2160-0', '1.1'],
+        ]
+        assert rows[0][4] == [3, 4, '80061', '2093-3', '180']
+
+        # parent without children, child before any parent
+        assert rows[0][3][0] == 2 and rows[0][3][2] == '85025'
+        assert np.isnan(rows[0][3][1]) and np.isnan(rows[0][3][3])
+        assert np.isnan(rows[0][0][0]) and rows[0][0][3] == '0000-0'
+        assert all(np.isnan(val) for val in rows[1][0])
@@ -5,7 +5,8 @@ import numpy as np
 import pandas as pd
 from tidy_hl7_msgs.helpers import (
     concat, flatten, zip_nested, are_lens_equal, are_segs_identical,
-    are_nested_lens_equal, zip_msg_ids, trim_rows, to_df, join_dfs
+    are_nested_lens_equal, zip_msg_ids, to_df, to_wide_df, join_dfs,
+    get_col_names, join_cols, sort_cols, to_cols, to_split_cols
 )
 
 def test_are_lens_equal():
@@ -72,18 +73,6 @@ def test_zip_msg_ids():
     with pytest.raises(AssertionError):
         zip_msg_ids(['a', 'b', 'c'], ['y', 'z'])
 
-def test_trim_rows():
-    # pylint: disable=invalid-name
-    d = {
-        'msg_id': ['123', '123', '123'],
-        'col1': [1, 2, np.nan],
-        'col2': [3, 4, np.nan],
-    }
-    df = pd.DataFrame(data=d)
-    n_segs = {'123': 2}
-    assert len(trim_rows(df, n_segs)) == 2
-
-
 def test_to_df():
     # pylint: disable=invalid-name
     d = {
@@ -143,3 +132,69 @@ def test_join_dfs():
     assert msg1_seg1 == expected_msg1_seg1
     assert msg2_seg1 == expected_msg2_seg1
     assert msg2_seg2 == expected_msg2_seg2
+
+
+def test_join_cols():
+    cols = [
+        {'msg_id': ['a', 'b'], 'seg': ['1', '1'], loc: vals}
+        for loc, vals in [('loc1', ['x', 'y']), ('loc2', ['u', 'v']), ('loc3', ['s', 't'])]
+    ]
+    joined = join_cols(cols)
+    df_join = join_dfs([pd.DataFrame(col) for col in cols])
+
+    assert list(joined) == list(df_join.columns)
+    assert joined == df_join.to_dict('list')
+
+    # columns of several locations at once are ordered as if joined one by one
+    multi = {
+        'msg_id': ['a', 'b'], 'seg': ['1', '1'], 'loc2': ['u', 'v'], 'loc3': ['s', 't']
+    }
+    assert list(join_cols([cols[0], multi])) == list(joined)
+
+def test_to_split_cols():
+    msg_ids = ['a', 'b', 'c']
+    elems_per_msg = [[['x', 'y'], ['z']], None, [['', 'w']]]
+    cols = to_split_cols(msg_ids, ['loc.1', 'loc.2'], elems_per_msg)
+
+    vals_per_col = [
+        [['x', 'z'], ['no_seg'], [np.nan]],
+        [['y', np.nan], ['no_seg'], ['w']],
+    ]
+    for name, vals in zip(['loc.1', 'loc.2'], vals_per_col):
+        expected = to_cols(zip_msg_ids(vals, msg_ids), name)
+        assert cols['msg_id'] == expected['msg_id']
+        pd.testing.assert_series_equal(pd.Series(cols['seg']), pd.Series(expected['seg']))
+        pd.testing.assert_series_equal(pd.Series(cols[name]), pd.Series(expected[name]))
+
+def test_sort_cols():
+    cols = {'msg_id': ['b', 'a', 'b'], 'seg': [2.0, 1.0, 1.0], 'loc': ['x', 'y', 'z']}
+    assert sort_cols(cols, ['msg_id', 'seg']) == {
+        'msg_id': ['a', 'b', 'b'], 'seg': [1.0, 1.0, 2.0], 'loc': ['y', 'z', 'x']
+    }
+    # stable
+    assert sort_cols(cols, ['msg_id'])['loc'] == ['y', 'x', 'z']
+
+
+def test_to_wide_df():
+    # pylint: disable=invalid-name
+    msg_ids = ['msg_id1', 'msg_id2', 'msg_id3']
+    vals_per_loc = [
+        [['a'], ['b', 'c'], ['no_seg']],
+        [['x'], [np.nan, 'z'], ['no_seg']],
+    ]
+    df = to_wide_df(msg_ids, vals_per_loc, ['loc1', 'loc2'])
+    assert list(df.columns) == ['msg_id', 'loc1_1', 'loc1_2', 'loc2_1', 'loc2_2']
+    assert df.loc[0].tolist()[:2] == ['msg_id1', 'a']
+    assert df.loc[1, ['loc1_1', 'loc1_2', 'loc2_2']].tolist() == ['b', 'c', 'z']
+    assert pd.isnull(df.loc[1, 'loc2_1'])
+    assert pd.isnull(df.loc[0, 'loc1_2'])
+    assert df.loc[2, ['loc1_1', 'loc1_2', 'loc2_1', 'loc2_2']].isnull().all()
+
+    df_capped = to_wide_df(msg_ids, vals_per_loc, ['loc1', 'loc2'], max_reps=1)
+    assert list(df_capped.columns) == ['msg_id', 'loc1_1', 'loc2_1']
+
+def test_get_col_names():
+    assert get_col_names(['DG1.3.1', 'DG1.6']) == ['DG1.3.1', 'DG1.6']
+    assert get_col_names({'DG1.3.1': 'diag_code', 'DG1.6': 'diag_type'}) == (
+        ['diag_code', 'diag_type']
+    )
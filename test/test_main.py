@@ -6,7 +6,10 @@ Unit Testing
 from test.mock_data import MSGS
 import pytest
 import numpy as np
-from tidy_hl7_msgs.main import tidy_segs
+import pandas as pd
+from tidy_hl7_msgs.main import tidy_segs, tidy_cols
+from tidy_hl7_msgs.parsers import parse_msg_id
+from tidy_hl7_msgs.scanner import MsgBatch
 
 MSG_ID_LOCS = {
     'MSH.7': 'msg_date_time',
@@ -130,3 +133,168 @@ def test_print_tidy_segs():
     df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS)
     print('\n\n')
     print(df)
+
+def test_numpy_engine():
+    # pylint: disable=invalid-name
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS)
+    df_numpy = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, engine='numpy')
+    assert df.equals(df_numpy)
+
+def test_msg_filter():
+    # pylint: disable=invalid-name
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, msg_filter={'MSH.4.2': 'Facility A'})
+    assert set(df['msg_date_time']) == {'20170515104040'}
+    assert len(df) == 2
+
+    with pytest.raises(ValueError):
+        tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, msg_filter={'MSH.9.2': 'A01'})
+
+    # batches are filtered by index and parse the matching messages
+    for msgs, engine in [(MSGS, 'numpy'), (MSGS, 'parallel'), (MsgBatch(MSGS), 'python')]:
+        pd.testing.assert_frame_equal(df, tidy_segs(
+            MSG_ID_LOCS, REPORT_LOCS_DG1, msgs, engine, msg_filter={'MSH.4.2': 'Facility A'}
+        ))
+        with pytest.raises(ValueError):
+            tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, msgs, engine, msg_filter={'MSH.9.2': 'A01'})
+
+    # matches are de-duplicated once filtered
+    msgs = [MSGS[0], MSGS[1], MSGS[0], MSGS[2]]
+    for engine in ['python', 'numpy', 'parallel']:
+        for preserve_order in [False, True]:
+            pd.testing.assert_frame_equal(df, tidy_segs(
+                MSG_ID_LOCS, REPORT_LOCS_DG1, msgs, engine, preserve_order=preserve_order,
+                msg_filter={'MSH.4.2': 'Facility A'}
+            ))
+
+def test_tidy_cols():
+    # message IDs are returned with the distinct messages they were parsed from
+    msgs = [MSGS[0], MSGS[1], MSGS[0], MSGS[2]]
+    for engine in ['python', 'numpy', 'parallel']:
+        for msg_filter in [None, {'MSH.4.2': {'Facility A', 'Facility C'}}]:
+            _, msg_ids, msgs_parsed = tidy_cols(
+                MSG_ID_LOCS, REPORT_LOCS_DG1, msgs, engine, msg_filter=msg_filter
+            )
+            msgs_parsed = list(msgs_parsed)
+            assert len(set(msgs_parsed)) == len(msgs_parsed)
+            assert msg_ids == parse_msg_id(list(MSG_ID_LOCS), msgs_parsed)
+
+def test_preserve_order():
+    # pylint: disable=invalid-name
+    msgs = [MSGS[2], MSGS[0], MSGS[2], MSGS[1]]
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, msgs, preserve_order=True)
+    assert list(df['facility_code']) == ['789', '123', '123', '456']
+    assert df['seg'].tolist()[1:] == [1.0, 2.0, 1.0]
+
+    df_sorted = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, msgs)
+    df_sorted_order = df.sort_values(by=['msg_date_time', 'seg']).reset_index(drop=True)
+    assert df_sorted_order.equals(df_sorted)
+
+def test_wide():
+    # pylint: disable=invalid-name
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, wide=True)
+    assert len(df) == 3
+    assert 'seg' not in df.columns
+    assert list(df.columns) == [
+        'msg_date_time', 'facility_code',
+        'diag_code_1', 'diag_code_2',
+        'diag_type_1', 'diag_type_2',
+        'diag_dr_1', 'diag_dr_2',
+    ]
+
+    df_long = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS)
+    msg_1 = df.loc[df['facility_code'] == '123'].iloc[0]
+    msg_1_long = df_long.loc[df_long['facility_code'] == '123']
+    assert msg_1['diag_code_1'] == msg_1_long['diag_code'].iloc[0]
+    assert msg_1['diag_type_1'] == msg_1_long['diag_type'].iloc[0]
+    assert np.isnan(msg_1['diag_code_2'])
+
+    df_capped = tidy_segs(['MSH.7'], ['DG1.3.1'], MSGS, wide=True, max_reps=1)
+    assert list(df_capped.columns) == ['MSH.7', 'DG1.3.1_1']
+
+    with pytest.raises(ValueError):
+        tidy_segs(['MSH.7'], ['DG1.3.1'], MSGS, wide=True, max_reps=0)
+
+def test_parallel_engine():
+    # pylint: disable=invalid-name
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS)
+    df_parallel = tidy_segs(
+        MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, engine='parallel', n_workers=2
+    )
+    assert df.equals(df_parallel)
+
+def test_wildcard_report_locs():
+    # pylint: disable=invalid-name
+    df = tidy_segs(MSG_ID_LOCS, ['DG1.3.*', 'DG1.6'], MSGS)
+    df_listed = tidy_segs(MSG_ID_LOCS, ['DG1.3.1', 'DG1.3.2', 'DG1.3.3', 'DG1.6'], MSGS)
+    assert df.equals(df_listed)
+
+    df = tidy_segs(MSG_ID_LOCS, {'DG1': 'diag'}, MSGS, wide=True)
+    assert 'diag.6_1' in df.columns
+
+def test_parent_seg():
+    # pylint: disable=invalid-name
+    from test.mock_data import MSG_ORU
+    report_locs = {'OBR.4.1': 'panel', 'OBX.3.1': 'test', 'OBX.5': 'result'}
+    df = tidy_segs(['MSH.7'], report_locs, [MSG_ORU] + MSGS, parent_seg='OBR')
+    df_oru = df[df['MSH.7'] == '20170801090000']
+    assert list(df_oru.columns) == ['MSH.7', 'parent_seg', 'seg', 'panel', 'test', 'result']
+    assert df_oru['test'].tolist()[1:3] == ['2345-7', '2160-0']
+    assert df_oru['panel'].tolist()[1:] == ['80048', '80048', '85025', '80061']
+    assert df_oru['seg'].tolist()[1:3] == [2, 3]
+    assert len(df) == len(df_oru) + 3
+
+    df_engine = tidy_segs(
+        ['MSH.7'], report_locs, [MSG_ORU] + MSGS, parent_seg='OBR', engine='numpy'
+    )
+    assert df.equals(df_engine)
+
+    with pytest.raises(ValueError):
+        tidy_segs(['MSH.7'], ['OBR.4.1', 'OBX.5', 'NTE.3'], [MSG_ORU], parent_seg='OBR')
+    with pytest.raises(ValueError):
+        tidy_segs(['MSH.7'], ['OBR.4.1', 'OBX.5'], [MSG_ORU], parent_seg='OBR', wide=True)
+
+def test_output():
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS)
+    records = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, output='records')
+    pd.testing.assert_frame_equal(pd.DataFrame(records), df, check_dtype=False)
+
+    arr = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, output='numpy')
+    assert list(arr.dtype.names) == list(df.columns)
+    pd.testing.assert_frame_equal(pd.DataFrame(arr), df, check_dtype=False)
+
+    with pytest.raises(ValueError):
+        tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, output='excel')
+
+def test_dtypes():
+    # locations without any values are objects, like the others
+    for report_locs, wide in [(['PR1.5'], False), (['DG1.3.1', 'DG1.16'], False),
+                              (['DG1.3.1', 'DG1.16'], True)]:
+        df = tidy_segs(MSG_ID_LOCS, report_locs, MSGS, wide=wide)
+        assert (df.dtypes == object).all()
+        assert df[report_locs[-1] + ('_1' if wide else '')].isnull().all()
+
+def test_limit_and_sample():
+    def gen():
+        yield from MSGS[:2]
+        raise AssertionError("Input consumed past limit")
+
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, gen(), limit=2)
+    assert set(df['facility_code']) == {'123', '456'}
+
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS * 100, limit=1)
+    assert set(df['facility_code']) == {'123'}
+
+    df = tidy_segs(
+        MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, limit=1, msg_filter={'PID.3.1': '456'}
+    )
+    assert set(df['facility_code']) == {'456'}
+
+    df = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, iter(MSGS * 100), sample=2, seed=0)
+    assert len(set(df['facility_code'])) <= 2
+    sampled = tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, iter(MSGS * 100), sample=2, seed=0)
+    pd.testing.assert_frame_equal(df, sampled)
+
+    with pytest.raises(ValueError):
+        tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, limit=1, sample=1)
+    with pytest.raises(ValueError):
+        tidy_segs(MSG_ID_LOCS, REPORT_LOCS_DG1, MSGS, limit=0)
@@ -0,0 +1,32 @@
+# pylint: disable=missing-docstring
+
+import pytest
+from test.memory import (
+    make_corpus, get_stages, measure, get_threshold, read_baselines, find_regressions
+)
+
+BASELINES = read_baselines()
+STAGES = ['parse_msgs', 'to_cols', 'sort_cols', 'to_pandas', 'to_df', 'join_dfs', 'tidy_segs']
+
+@pytest.fixture(scope='module')
+def stages():
+    return get_stages(make_corpus())
+
+def test_find_regressions():
+    baseline = {'peak': 100, 'retained_blocks': 10}
+    assert find_regressions({'peak': 120, 'retained_blocks': 12}, baseline) == []
+    assert find_regressions({'peak': 130, 'retained_blocks': 10}, baseline) == [
+        'peak: 130 > 100 (+30%)'
+    ]
+    assert find_regressions({'peak': 130, 'retained_blocks': 10}, baseline, 1.0) == []
+
+@pytest.mark.parametrize('name', STAGES)
+def test_memory(name, stages):
+    if BASELINES is None or name not in BASELINES['stages']:
+        pytest.skip("No memory baseline; run: python -m test.memory")
+
+    # baselines of other versions still catch blowups, with a wider threshold
+    regressions = find_regressions(
+        measure(stages[name]), BASELINES['stages'][name], get_threshold(BASELINES)
+    )
+    assert not regressions, "{name}: {regs}".format(name=name, regs=", ".join(regressions))
@@ -0,0 +1,40 @@
+# pylint: disable=missing-docstring
+
+import pytest
+import numpy as np
+from tidy_hl7_msgs.outputs import get_builder, to_pandas, to_numpy, to_records
+
+COLS = {
+    'msg_id': ['a', 'b'],
+    'seg': [1.0, np.nan],
+    'loc': ['x', np.nan],
+}
+
+def test_to_pandas():
+    df = to_pandas(COLS)
+    assert list(df.columns) == list(COLS)
+    assert (df.dtypes == object).all()
+    assert to_pandas({'msg_id': ['a'], 'loc': [np.nan]})['loc'].dtype == object
+    assert df['loc'][0] == 'x' and np.isnan(df['loc'][1])
+
+def test_to_numpy():
+    arr = to_numpy(COLS)
+    assert arr.dtype.names == tuple(COLS)
+    assert list(arr['msg_id']) == ['a', 'b']
+    assert arr['loc'][0] == 'x' and np.isnan(arr['loc'][1])
+
+def test_to_records():
+    records = to_records(COLS)
+    assert records[0] == {'msg_id': 'a', 'seg': 1.0, 'loc': 'x'}
+    assert records[1]['msg_id'] == 'b' and np.isnan(records[1]['loc'])
+
+def test_to_arrow():
+    pytest.importorskip('pyarrow')
+    table = get_builder('arrow')(COLS)
+    assert table.column_names == list(COLS)
+    assert table.column('loc').to_pylist() == ['x', None]
+
+def test_get_builder():
+    assert get_builder(len)(COLS) == 3
+    with pytest.raises(ValueError):
+        get_builder('excel')
@@ -0,0 +1,43 @@
+# pylint: disable=missing-docstring, invalid-name
+
+from test.mock_data import MSGS
+from test.test_scanner import LOCS, EDGE_MSGS
+import pytest
+from tidy_hl7_msgs.parsers import parse_msgs, parse_loc_txt
+from tidy_hl7_msgs.parallel import SharedBatch
+
+def test_parse_matches_python_engine():
+    msgs = (MSGS + EDGE_MSGS) * 3
+    with SharedBatch(msgs, n_workers=4) as batch:
+        batch.prefetch([parse_loc_txt(loc) for loc in LOCS])
+        for loc in LOCS:
+            assert batch.parse(parse_loc_txt(loc)) == parse_msgs(loc, msgs)
+
+def test_parse_msgs_parallel():
+    assert parse_msgs('DG1.3.1', MSGS, 'parallel') == parse_msgs('DG1.3.1', MSGS)
+
+def test_more_workers_than_msgs():
+    with SharedBatch(MSGS[:1], n_workers=4) as batch:
+        assert len(batch.slices) == 1
+        assert batch.parse(parse_loc_txt('DG1.6')) == parse_msgs('DG1.6', MSGS[:1])
+
+def test_invalid_msgs():
+    with SharedBatch(['MSH'] + MSGS, n_workers=2) as batch:
+        with pytest.raises(ValueError):
+            batch.parse(parse_loc_txt('DG1.6'))
+
+def test_non_ascii_msgs():
+    msgs = [msg.replace('JOHN', 'JOSÉ') for msg in MSGS]
+    loc = parse_loc_txt('PID.5.2')
+    with SharedBatch(msgs, n_workers=2) as batch:
+        assert not hasattr(batch, 'raw')
+        assert batch.parse(loc) == parse_msgs('PID.5.2', msgs)
+        assert batch.get_seps() == ['|^'] * len(msgs)
+
+def test_workers_reused():
+    with SharedBatch(MSGS, n_workers=2) as batch:
+        executor = batch.executor
+        batch.parse(parse_loc_txt('DG1.3.1'))
+    with SharedBatch(MSGS, n_workers=2) as batch:
+        assert batch.executor is executor
+        assert batch.parse(parse_loc_txt('DG1.3.1')) == parse_msgs('DG1.3.1', MSGS)
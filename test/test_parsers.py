@@ -1,7 +1,9 @@
 # pylint: disable=missing-docstring, invalid-name
 
 from test.mock_data import MSGS
-from tidy_hl7_msgs.parsers import parse_msgs, parse_msg_id, parse_loc_txt
+from tidy_hl7_msgs.parsers import (
+    parse_msgs, parse_msg_id, parse_loc_txt, parse_wildcard, parse_report_locs
+)
 import pytest
 import numpy as np
 
@@ -11,6 +13,37 @@ def test_parse_msgs():
     assert parse_msgs('PR1.5', MSGS) == [['no_seg'], ['no_seg'], [np.nan]]
     assert parse_msgs('PR1.5.1', MSGS) == [['no_seg'], ['no_seg'], [np.nan]]
 
+def test_parse_wildcard():
+    for engine in ['python', 'numpy', 'parallel']:
+        parsed = parse_wildcard('DG1.*', MSGS, engine)
+        assert list(parsed) == ['DG1.{n}'.format(n=n) for n in range(1, 7)]
+        for loc, vals in parsed.items():
+            assert vals == parse_msgs(loc, MSGS)
+
+        parsed = parse_wildcard('DG1.3.*', MSGS, engine)
+        assert list(parsed) == ['DG1.3.1', 'DG1.3.2', 'DG1.3.3']
+        for loc, vals in parsed.items():
+            assert vals == parse_msgs(loc, MSGS)
+
+        parsed = parse_wildcard('MSH', MSGS, engine)
+        assert list(parsed)[0] == 'MSH.2'
+        assert parsed['MSH.9'] == parse_msgs('MSH.9', MSGS)
+
+    # missing in all messages
+    assert parse_wildcard('EVN.*', MSGS) == {'EVN.1': [['no_seg']] * 3}
+
+    with pytest.raises(ValueError):
+        parse_wildcard('DG1.3', MSGS)
+    with pytest.raises(ValueError):
+        parse_msgs('DG1.*', MSGS)
+
+def test_parse_report_locs():
+    parsed = parse_report_locs(['DG1.3.*', 'DG1.6'], MSGS)
+    assert list(parsed) == ['DG1.3.1', 'DG1.3.2', 'DG1.3.3', 'DG1.6']
+
+    parsed = parse_report_locs({'DG1.3.*': 'diag', 'DG1.6': 'diag_type'}, MSGS)
+    assert list(parsed) == ['diag.1', 'diag.2', 'diag.3', 'diag_type']
+
 def test_parse_loc_txt():
     field_d2 = parse_loc_txt('PR1.3')
     assert field_d2['depth'] == 2
@@ -29,10 +62,17 @@ def test_parse_loc_txt():
     assert msh_d3['field'] == 2
     assert msh_d3['comp'] == 0
 
-    with pytest.raises(ValueError):
-        parse_loc_txt('DG1')
+    # entire segment and wildcards
+    assert parse_loc_txt('DG1') == {'seg': 'DG1', 'depth': 2, 'wildcard': True}
+    assert parse_loc_txt('DG1.*') == {'seg': 'DG1', 'depth': 2, 'wildcard': True}
+    assert parse_loc_txt('MSH.9.*') == (
+        {'seg': 'MSH', 'field': 8, 'depth': 3, 'wildcard': True}
+    )
+
     with pytest.raises(ValueError):
         parse_loc_txt('DG1.2.3.4')
+    with pytest.raises(ValueError):
+        parse_loc_txt('DG1.*.1')
 
 def test_parse_msg_ids():
     assert parse_msg_id(['PID.3.1', 'PID.3.4', 'MSH.7'], MSGS) == (
@@ -0,0 +1,111 @@
+# pylint: disable=missing-docstring, invalid-name
+
+from test.mock_data import MSGS, MSG_1, MSG_2, MSG_3
+import os
+import pytest
+from tidy_hl7_msgs.filters import prefix
+from tidy_hl7_msgs.main import tidy_segs
+from tidy_hl7_msgs.partitions import (
+    run_partitions, read_partitions, read_manifest, hash_keys
+)
+
+ID_LOCS = ['MSH.7', 'PID.3.1']
+REPORT_LOCS = ['DG1.3.1', 'DG1.6']
+
+def write_files(tmp_path, groups):
+    paths = []
+    for i, msgs in enumerate(groups):
+        path = tmp_path / 'msgs_{i}.hl7'.format(i=i)
+        path.write_text(''.join(msgs))
+        paths.append(str(path))
+    return paths
+
+def test_hash_keys():
+    assert list(hash_keys(['a', 'b'])) == sorted(hash_keys(['b', 'a']))
+    assert len(set(hash_keys(['a', 'b', 'c']))) == 3
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_run_partitions(tmp_path, n_workers):
+    paths = write_files(tmp_path, [[MSG_1, MSG_2], [MSG_3]])
+    out_dir = str(tmp_path / 'out')
+
+    outputs = run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=n_workers)
+    assert all(os.path.exists(output) for output in outputs)
+
+    df = read_partitions(out_dir)
+    expected = tidy_segs(ID_LOCS, REPORT_LOCS, MSGS)
+    assert df.sort_values(by=['MSH.7', 'seg']).reset_index(drop=True).equals(expected)
+
+    manifest = read_manifest(out_dir)
+    assert sorted(part['n_msgs'] for part in manifest['partitions'].values()) == [1, 2]
+
+def test_resume(tmp_path):
+    paths = write_files(tmp_path, [[MSG_1], [MSG_2]])
+    out_dir = str(tmp_path / 'out')
+    outputs = run_partitions(paths[:1], out_dir, ID_LOCS, REPORT_LOCS, n_workers=1)
+    mtime = os.stat(outputs[0]).st_mtime_ns
+
+    # completed partition is skipped, new one processed
+    outputs = run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1)
+    assert os.stat(outputs[0]).st_mtime_ns == mtime
+    assert len(read_manifest(out_dir)['partitions']) == 2
+
+    with pytest.raises(ValueError):
+        run_partitions(paths, out_dir, ID_LOCS, ['PR1.3'], n_workers=1)
+
+    # other tidy_segs options
+    with pytest.raises(ValueError, match='max_reps, wide'):
+        run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1,
+                       wide=True, max_reps=2)
+    with pytest.raises(ValueError, match='msg_filter'):
+        run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1,
+                       msg_filter={'MSH.7': prefix('2017')})
+
+def test_resume_same_options(tmp_path):
+    paths = write_files(tmp_path, [[MSG_1], [MSG_2]])
+    out_dir = str(tmp_path / 'out')
+    msg_filter = {'MSH.4.2': {'Facility A', 'Facility B'}, 'MSH.7': prefix('2017')}
+    run_partitions(paths[:1], out_dir, ID_LOCS, REPORT_LOCS, n_workers=1,
+                   wide=True, msg_filter=msg_filter)
+
+    run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1,
+                   wide=True, msg_filter=dict(msg_filter, **{'MSH.7': prefix('2017')}))
+    assert len(read_manifest(out_dir)['partitions']) == 2
+
+    # functions of the same name but other values are other options
+    with pytest.raises(ValueError, match='msg_filter'):
+        run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1,
+                       wide=True, msg_filter=dict(msg_filter, **{'MSH.7': prefix('2018')}))
+    with pytest.raises(ValueError, match='msg_filter'):
+        run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1, wide=True,
+                       msg_filter=dict(msg_filter, **{'MSH.7': lambda val: val < '2018'}))
+
+def test_output_not_supported(tmp_path):
+    paths = write_files(tmp_path, [[MSG_1]])
+    with pytest.raises(ValueError):
+        run_partitions(paths, str(tmp_path / 'out'), ID_LOCS, REPORT_LOCS,
+                       n_workers=1, output='records')
+
+def test_partition_without_matches(tmp_path):
+    paths = write_files(tmp_path, [[MSG_1], [MSG_2]])
+    out_dir = str(tmp_path / 'out')
+    run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1,
+                   msg_filter={'MSH.4.2': 'Facility A'})
+
+    parts = read_manifest(out_dir)['partitions'].values()
+    assert sorted(part['n_msgs'] for part in parts) == [0, 1]
+    df = read_partitions(out_dir)
+    expected = tidy_segs(ID_LOCS, REPORT_LOCS, MSGS, msg_filter={'MSH.4.2': 'Facility A'})
+    assert df.equals(expected)
+
+def test_failed_partition_kept_others(tmp_path):
+    paths = write_files(tmp_path, [[MSG_1], ['no messages here\n']])
+    out_dir = str(tmp_path / 'out')
+    with pytest.raises(RuntimeError):
+        run_partitions(paths, out_dir, ID_LOCS, REPORT_LOCS, n_workers=1)
+    assert len(read_manifest(out_dir)['partitions']) == 1
+
+def test_keys_unique_across_partitions(tmp_path):
+    paths = write_files(tmp_path, [[MSG_1, MSG_2], [MSG_2]])
+    with pytest.raises(RuntimeError):
+        run_partitions(paths, str(tmp_path / 'out'), ID_LOCS, REPORT_LOCS, n_workers=1)
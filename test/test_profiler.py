@@ -0,0 +1,47 @@
+# pylint: disable=missing-docstring
+
+from test.mock_data import MSGS
+import pytest
+from tidy_hl7_msgs.parsers import parse_msgs
+from tidy_hl7_msgs.profiler import HyperLogLog, profile_msgs, get_loc_key, get_loc_txt
+
+def test_hyperloglog():
+    hll = HyperLogLog()
+    for i in range(20000):
+        hll.add(str(i % 10000))
+    assert abs(hll.count() - 10000) / 10000 < 0.05
+
+    small = HyperLogLog()
+    for val in ['a', 'b', 'a', 'c']:
+        small.add(val)
+    assert round(small.count()) == 3
+
+def test_loc_keys():
+    for loc_txt in ['MSH.7', 'MSH.9.2', 'PID.3', 'PID.3.1']:
+        assert get_loc_txt(get_loc_key(loc_txt)) == loc_txt
+    with pytest.raises(ValueError):
+        get_loc_key('OBX.*')
+
+def test_profile_msgs():
+    profile = profile_msgs(MSGS * 2).to_df().set_index('loc')
+
+    for loc_txt in ['DG1.3.1', 'DG1.6', 'PID.5.1', 'PID.3.1']:
+        vals = [val for vals in parse_msgs(loc_txt, MSGS) for val in vals]
+        n_segs = len([val for val in vals if val != 'no_seg'])
+        filled = [val for val in vals if isinstance(val, str) and val != 'no_seg']
+
+        assert profile.loc[loc_txt, 'fill_rate'] == len(filled) / n_segs
+        assert profile.loc[loc_txt, 'distinct'] == len(set(filled))
+
+    dg1_reps = max(len(vals) for vals in parse_msgs('DG1.1', MSGS))
+    assert profile.loc['DG1.1', 'max_reps'] == dg1_reps
+
+def test_profile_ids():
+    profile = profile_msgs(MSGS * 2, id_locs=[['MSH.7', 'PID.3.1'], ['MSH.4'], ['DG1.3.1']])
+    ids = profile.ids_to_df().set_index('id_locs')
+
+    assert ids.loc['MSH.7,PID.3.1', 'complete_rate'] == 1.0
+    assert ids.loc['MSH.7,PID.3.1', 'uniqueness'] == 1.0
+
+    # repeated segment
+    assert ids.loc['DG1.3.1', 'complete_rate'] < 1.0
@@ -0,0 +1,50 @@
+# pylint: disable=missing-docstring, invalid-name
+
+from test.mock_data import MSGS
+import io
+import bz2
+import gzip
+import lzma
+import zipfile
+from tidy_hl7_msgs.readers import split_msgs, read_msgs, iter_msgs, iter_files_msgs
+
+def test_split_msgs():
+    assert split_msgs(''.join(MSGS)) == MSGS
+    assert split_msgs('header\n' + '    '.join(MSGS)) == MSGS
+    assert split_msgs('') == []
+
+def test_read_msgs(tmp_path):
+    path = tmp_path / 'msgs.hl7'
+    path.write_text(''.join(MSGS))
+    assert read_msgs(path) == MSGS
+
+def test_iter_msgs():
+    txt = 'header\n' + '    '.join(MSGS)
+    for chunk_size in [1, 7, 64, 1 << 20]:
+        assert list(iter_msgs(io.StringIO(txt), chunk_size)) == MSGS
+
+def test_read_compressed(tmp_path):
+    txt = ''.join(MSGS)
+    for ext, opener in [('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open)]:
+        path = tmp_path / ('msgs.hl7' + ext)
+        with opener(path, 'wt', newline='') as file:
+            file.write(txt)
+        assert read_msgs(path) == MSGS
+
+    path = tmp_path / 'msgs.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('a.hl7', ''.join(MSGS[:2]))
+        archive.writestr('b.hl7', MSGS[2])
+    assert read_msgs(path) == MSGS
+
+def test_iter_files_msgs(tmp_path):
+    paths = []
+    for i, msg in enumerate(MSGS):
+        path = tmp_path / 'msgs_{i}.hl7.gz'.format(i=i)
+        with gzip.open(path, 'wt', newline='') as file:
+            file.write(msg)
+        paths.append(path)
+    for n_workers in [1, 2]:
+        msgs = iter_files_msgs(paths, n_workers=n_workers)
+        assert next(msgs) == MSGS[0]
+        assert list(msgs) == MSGS[1:]
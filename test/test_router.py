@@ -0,0 +1,30 @@
+# pylint: disable=missing-docstring
+
+from test.mock_data import MSGS, MSG_ORU
+import pytest
+import pandas as pd
+from tidy_hl7_msgs.main import tidy_segs
+from tidy_hl7_msgs.router import parse_msg_types, route_msgs
+
+ADT = {'msg_id_locs': ['MSH.7'], 'report_locs': ['DG1.3.1']}
+ORU = {'msg_id_locs': ['MSH.7'], 'report_locs': ['OBX.3.1'], 'wide': True}
+
+def test_parse_msg_types():
+    assert parse_msg_types(MSGS + [MSG_ORU]) == ['ADT^A08'] * 3 + ['ORU^R01']
+    assert parse_msg_types(MSGS, engine='numpy') == ['ADT^A08'] * 3
+
+def test_route_msgs():
+    routed = route_msgs({'ADT': ADT, 'ORU^R01': ORU, 'SIU': ADT}, [MSG_ORU] + MSGS)
+
+    assert set(routed) == {'ADT', 'ORU^R01'}
+    pd.testing.assert_frame_equal(routed['ADT'], tidy_segs(['MSH.7'], ['DG1.3.1'], MSGS))
+    pd.testing.assert_frame_equal(
+        routed['ORU^R01'], tidy_segs(['MSH.7'], ['OBX.3.1'], [MSG_ORU], wide=True)
+    )
+
+    # trigger event takes precedence
+    routed = route_msgs({'ADT': ORU, 'ADT^A08': ADT}, MSGS)
+    assert set(routed) == {'ADT^A08'}
+
+    with pytest.raises(ValueError):
+        route_msgs({'ADT': {'report_locs': ['DG1.3.1']}}, MSGS)
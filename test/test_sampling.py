@@ -0,0 +1,30 @@
+# pylint: disable=missing-docstring
+
+from collections import Counter
+from tidy_hl7_msgs.sampling import head_msgs, sample_msgs
+
+def test_head_msgs():
+    consumed = []
+    def gen():
+        for i in range(1000):
+            consumed.append(i)
+            yield str(i // 2)
+
+    assert head_msgs(gen(), 3) == ['0', '1', '2']
+    assert len(consumed) == 5
+    assert head_msgs(['a', 'b'], 5) == ['a', 'b']
+
+def test_sample_msgs():
+    msgs = [str(i) for i in range(1000)]
+
+    sample = sample_msgs(iter(msgs), 10, seed=1)
+    assert len(sample) == 10 and set(sample) <= set(msgs)
+    assert sample_msgs(iter(msgs), 10, seed=1) == sample
+    assert sample_msgs(msgs[:5], 10) == msgs[:5]
+
+    # roughly uniform
+    counts = Counter(
+        msg for seed in range(500) for msg in sample_msgs(msgs[:20], 5, seed=seed)
+    )
+    assert len(counts) == 20
+    assert max(counts.values()) < 2 * min(counts.values())
@@ -0,0 +1,52 @@
+# pylint: disable=missing-docstring, invalid-name
+
+from test.mock_data import MSGS
+import pytest
+from tidy_hl7_msgs.parsers import parse_msgs, parse_loc_txt
+from tidy_hl7_msgs.scanner import MsgBatch
+
+LOCS = [
+    'MSH.1', 'MSH.2', 'MSH.4.2', 'MSH.7', 'MSH.9.2', 'MSH.20',
+    'PID.3.1', 'PID.3.2', 'PID.3.4', 'PID.5', 'PID.5.3',
+    'DG1.3', 'DG1.3.1', 'DG1.3.2', 'DG1.6', 'DG1.16', 'DG1.6.4',
+    'PR1.4', 'PR1.5', 'PR1.5.1', 'EVN.2',
+]
+
+EDGE_MSGS = [
+    # different separators, CRLF terminators and an unterminated last segment
+    'MSH#*~\\&##*Facility D###20170101000000##ADT*A01\r\n'
+    'PID#1##999***FACILITY D##DOE*JANE\r\n'
+    'DG1#1##A00*Cholera\r\n'
+    'DG1#2##B00*Herpes',
+    # segment name found mid-line and segments without data
+    'MSH|^~\\&||^Facility E|||20170101000001||ADT^A01\n'
+    'PID|1||111^^^FACILITY E||ROE^RICHARD DG1|9||X\n'
+    'DG1|\n'
+    'DG1\n',
+]
+
+def test_parse_matches_python_engine():
+    for loc in LOCS:
+        assert parse_msgs(loc, MSGS, 'numpy') == parse_msgs(loc, MSGS)
+        assert parse_msgs(loc, EDGE_MSGS, 'numpy') == parse_msgs(loc, EDGE_MSGS)
+
+def test_batch_reused_across_locs():
+    batch = MsgBatch(MSGS)
+    assert len(batch) == len(MSGS)
+    for loc in LOCS:
+        assert batch.parse(parse_loc_txt(loc)) == parse_msgs(loc, MSGS)
+
+def test_negative_indices():
+    batch = MsgBatch(MSGS)
+    loc = {'seg': 'DG1', 'field': -1, 'depth': 3, 'comp': -1}
+    assert batch.parse(loc) == [['AM', 'I10'], ['AM'], ['no_seg']]
+
+def test_invalid_msgs():
+    with pytest.raises(ValueError):
+        MsgBatch(['MSH'])
+    with pytest.raises(ValueError):
+        MsgBatch(['MSH§^~\\&|'])
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        parse_msgs('DG1.6', MSGS, 'cython')
@@ -0,0 +1,71 @@
+# pylint: disable=missing-docstring
+
+from test.mock_data import MSGS, MSG_ORU
+import pytest
+import pandas as pd
+from tidy_hl7_msgs.main import tidy_segs
+from tidy_hl7_msgs.sorting import write_run, read_run, merge_runs, tidy_sorted
+
+ID_LOCS = {'MSH.7': 'msg_date_time', 'PID.3.1': 'facility_code'}
+REPORT_LOCS = ['DG1.3.1', 'DG1.6']
+
+# distinct messages, in no particular order of ID
+CORPUS = [
+    msg.replace('^^^FACILITY', '{i}^^^FACILITY'.format(i=(i * 7) % 23))
+    for i in range(23) for msg in MSGS
+]
+
+def test_merge_runs(tmp_path):
+    runs = [[(1, 'a'), (3, 'a'), (5, 'a')], [(1, 'b'), (2, 'b')], []]
+    paths = [tmp_path / str(i) for i in range(len(runs))]
+    for rows, path in zip(runs, paths):
+        write_run(rows, path)
+
+    assert list(read_run(paths[0])) == runs[0]
+    assert list(merge_runs(paths, key=lambda row: row[0])) == [
+        (0, (1, 'a')), (1, (1, 'b')), (1, (2, 'b')), (0, (3, 'a')), (0, (5, 'a'))
+    ]
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 1000])
+def test_tidy_sorted(chunk_size, tmp_path):
+    # duplicates across chunks are dropped
+    msgs = CORPUS + CORPUS[:10]
+    expected = tidy_segs(ID_LOCS, REPORT_LOCS, msgs)
+
+    chunks = list(tidy_sorted(ID_LOCS, REPORT_LOCS, iter(msgs), chunk_size, tmp_path))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+    assert not list(tmp_path.iterdir())
+
+@pytest.mark.parametrize('engine', ['numpy', 'parallel'])
+def test_tidy_sorted_engines(engine):
+    msgs = CORPUS + CORPUS[:10]
+    expected = tidy_segs(ID_LOCS, REPORT_LOCS, msgs)
+    chunks = tidy_sorted(ID_LOCS, REPORT_LOCS, msgs, 7, engine=engine)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+def test_tidy_sorted_options():
+    expected = tidy_segs(ID_LOCS, REPORT_LOCS, CORPUS, wide=True, max_reps=2)
+    chunks = tidy_sorted(ID_LOCS, REPORT_LOCS, CORPUS, 5, wide=True, max_reps=2)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+    msgs = [MSG_ORU.replace('20170801090000', str(i)) for i in range(5)]
+    report_locs = ['OBR.4.1', 'OBX.3.1']
+    expected = tidy_segs(['MSH.7'], report_locs, msgs, parent_seg='OBR')
+    chunks = tidy_sorted(['MSH.7'], report_locs, msgs[::-1], 2, parent_seg='OBR')
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+    records = tidy_sorted(
+        ID_LOCS, REPORT_LOCS, CORPUS, 7, output='records', msg_filter={'PID.3.1': '1233'}
+    )
+    assert {row['facility_code'] for chunk in records for row in chunk} == {'1233'}
+
+    with pytest.raises(ValueError):
+        list(tidy_sorted(ID_LOCS, REPORT_LOCS, CORPUS, preserve_order=True))
+
+def test_tidy_sorted_ids_not_unique():
+    msgs = [MSGS[0], MSGS[0].replace('DG1|1', 'DG1|9')]
+    with pytest.raises(RuntimeError):
+        tidy_segs(ID_LOCS, REPORT_LOCS, msgs)
+    with pytest.raises(RuntimeError):
+        list(tidy_sorted(ID_LOCS, REPORT_LOCS, msgs, chunk_size=1))
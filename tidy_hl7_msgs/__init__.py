@@ -1,2 +1,5 @@
 # pylint: disable=missing-docstring
+__version__ = '0.1.0'
+
 from .main import tidy_segs
+from .filters import prefix
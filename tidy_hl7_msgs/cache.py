@@ -0,0 +1,213 @@
+'''
+On-disk cache of parsed HL7 message files
+'''
+
+import os
+import hashlib
+import numpy as np
+from tidy_hl7_msgs import __version__
+from tidy_hl7_msgs.readers import get_msg_bounds, OPENERS
+from tidy_hl7_msgs.scanner import MsgBatch, group_vals, group_segs
+
+HASH_CHUNK = 1 << 24
+
+def hash_file(buf):
+    ''' Hash of a file's contents
+
+    Parameters
+    ----------
+    buf : bytes-like of file contents
+
+    Returns
+    -------
+    String
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    view = memoryview(buf)
+    for start in range(0, len(view), HASH_CHUNK):
+        digest.update(view[start:start + HASH_CHUNK])
+    return digest.hexdigest()
+
+def get_loc_key(loc):
+    ''' File name of a location in the cache
+
+    Parameters
+    ----------
+    loc : dict of location attributes and values
+
+    Returns
+    -------
+    String
+
+    Examples
+    --------
+    >>> get_loc_key(parse_loc_txt('DG1.3.1'))
+    'comp=0,depth=3,field=3,seg=DG1'
+    '''
+    return ",".join("{k}={v}".format(k=k, v=v) for k, v in sorted(loc.items()))
+
+def save_array(path, arr):
+    ''' Save an array, replacing any previous one atomically '''
+    with open(path + '.tmp', 'wb') as file:
+        np.save(file, arr)
+    os.replace(path + '.tmp', path)
+
+class CachedBatch:
+    ''' Batch of HL7 messages from a file, with parsed locations cached on disk
+
+    The file is memory mapped and split into messages, which are
+    de-duplicated in the order they first occur. Message positions and the
+    positions of values located for each location are stored as NumPy arrays
+    in a directory keyed by the hash of the file's contents and the library
+    version. Later batches over the same file load cached locations with
+    memory mapping, and only scan the file (see scanner.MsgBatch) for
+    locations not yet cached.
+
+    Pass as msgs to tidy_segs, or to parsers.parse_msgs.
+
+    Parameters
+    ----------
+    path : string or path of an uncompressed, UTF-8 encoded file of HL7 v2
+        messages
+    cache_dir : string or path of cache directory, created if needed
+
+    Raises
+    ------
+    ValueError if file is compressed
+
+    Examples
+    --------
+    >>> batch = CachedBatch('2017-05.hl7', 'hl7_cache')
+    >>> df = tidy_segs(['MSH.7', 'PID.3.1'], ['DG1.3.1'], batch)
+    '''
+    def __init__(self, path, cache_dir):
+        if os.path.splitext(path)[1].lower() in list(OPENERS) + ['.zip']:
+            raise ValueError("Cached files must not be compressed")
+
+        if os.path.getsize(path):
+            self.raw = np.memmap(path, dtype=np.uint8, mode='r')
+        else:
+            self.raw = np.empty(0, dtype=np.uint8)
+
+        self.dir = os.path.join(
+            cache_dir,
+            "{digest}-{version}".format(digest=hash_file(self.raw), version=__version__)
+        )
+        os.makedirs(self.dir, exist_ok=True)
+
+        msgs_path = os.path.join(self.dir, 'msgs.npy')
+        if os.path.exists(msgs_path):
+            self.starts, self.ends = np.load(msgs_path, mmap_mode='r')
+        else:
+            self.starts, self.ends = self.find_msgs()
+            save_array(msgs_path, np.array([self.starts, self.ends], dtype=np.int64))
+
+        self._batch = None
+
+    def find_msgs(self):
+        ''' Positions of messages in the file, de-duplicated in order
+
+        Returns
+        -------
+        Tuple of arrays: message start positions and message end positions
+        '''
+        starts, ends = get_msg_bounds(memoryview(self.raw))
+        first = {}
+        for start, end in zip(starts, ends):
+            first.setdefault(self.raw[start:end].tobytes(), (start, end))
+        bounds = np.array(list(first.values()), dtype=np.int64).reshape(-1, 2)
+        return bounds[:, 0], bounds[:, 1]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return (
+            self.raw[start:end].tobytes().decode('utf-8')
+            for start, end in zip(self.starts.tolist(), self.ends.tolist())
+        )
+
+    def get_seps(self):
+        ''' Field and component separators of each message '''
+        starts = np.asarray(self.starts)
+        return [
+            chr(field_sep) + chr(comp_sep)
+            for field_sep, comp_sep in zip(
+                self.raw[starts + 3].tolist(), self.raw[starts + 4].tolist()
+            )
+        ]
+
+    def get_raw(self):
+        ''' Bytes-like of the file, which located positions index '''
+        return memoryview(self.raw)
+
+    @property
+    def batch(self):
+        ''' Scan of the messages, packed back to back, built on first use '''
+        if self._batch is None:
+            self._batch = MsgBatch.from_buffer(
+                np.concatenate(
+                    [self.raw[start:end] for start, end in zip(self.starts, self.ends)]
+                    + [np.empty(0, dtype=np.uint8)]
+                ),
+                np.asarray(self.ends - self.starts)
+            )
+        return self._batch
+
+    def locate(self, loc):
+        ''' Locate values of all messages at a given location, from the cache
+        if possible
+
+        Parameters
+        ----------
+        loc : dict of location attributes and values
+
+        Returns
+        -------
+        Int64 array of shape (4, n): message indices, value start positions,
+        value end positions and whether the value is present, with positions
+        in the file
+        '''
+        loc_path = os.path.join(self.dir, get_loc_key(loc) + '.npy')
+        if os.path.exists(loc_path):
+            return np.load(loc_path, mmap_mode='r')
+
+        msg_idx, starts, ends, has_val = self.batch.locate(loc)
+
+        # from positions in the packed batch to positions in the file
+        offsets = self.starts[msg_idx] - self.batch.starts[msg_idx]
+        located = np.array(
+            [msg_idx, starts + offsets, ends + offsets, has_val], dtype=np.int64
+        ).reshape(4, -1)
+        save_array(loc_path, located)
+        return located
+
+    def parse(self, loc):
+        ''' Parse all messages at a given location
+
+        Parameters
+        ----------
+        loc : dict of location attributes and values
+
+        Returns
+        -------
+        List(list(string)), as returned by parsers.parse_msgs
+        '''
+        located = self.locate(loc)
+        return group_vals(
+            self.get_raw(), len(self), *located[:3], located[3].astype(bool)
+        )
+
+    def parse_segs(self, segs):
+        ''' Walk messages for segments of several types, in message order
+
+        Parameters
+        ----------
+        segs : list(string) of segment names
+
+        Returns
+        -------
+        List(list(tuple(string, string))), as returned by parsers.walk_segs
+        '''
+        located = [self.locate({'seg': seg, 'depth': 1})[:3] for seg in segs]
+        return group_segs(self.get_raw(), len(self), segs, located)
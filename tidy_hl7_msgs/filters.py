@@ -0,0 +1,146 @@
+'''
+Message filters
+'''
+
+import itertools
+from tidy_hl7_msgs.parsers import parse_msgs, is_batch
+from tidy_hl7_msgs.scanner import MsgBatch, BatchView
+
+NO_MATCHES = "No HL7 v2 messages satisfy the filter"
+
+def prefix(txt):
+    ''' Predicate for values beginning with a prefix
+
+    Parameters
+    ----------
+    txt : string
+
+    Returns
+    -------
+    Function returning True if a value begins with txt
+
+    Examples
+    --------
+    >>> is_2017 = prefix('2017')
+    >>> is_2017('20170515104040')
+    True
+    '''
+    def predicate(val):
+        return val.startswith(txt)
+    return predicate
+
+def get_predicate(cond):
+    ''' Convert a filter condition to a predicate
+
+    Parameters
+    ----------
+    cond : string, set/list/tuple(string) or function
+
+        A string matches equal values, a collection matches values it
+        contains, and a function is used as the predicate itself.
+
+    Returns
+    -------
+    Function returning True if a value satisfies the condition
+
+    Raises
+    ------
+    ValueError if condition is not a string, collection or function
+
+    Examples
+    --------
+    >>> get_predicate('ADT^A08')('ADT^A08')
+    True
+    >>> get_predicate({'Facility A', 'Facility B'})('Facility C')
+    False
+    '''
+    if callable(cond):
+        return cond
+
+    if isinstance(cond, str):
+        return lambda val: val == cond
+
+    if isinstance(cond, (set, frozenset, list, tuple)):
+        vals = frozenset(cond)
+        return lambda val: val in vals
+
+    raise ValueError(
+        "Filter condition must be a string, a collection of strings or a function"
+    )
+
+def filter_msgs(msg_filter, msgs, engine='python'):
+    ''' Filter messages by values at given locations
+
+    Each location is parsed on its own, without parsing message IDs or
+    report locations, so non-matching messages are dropped cheaply. A
+    message is kept if, for every location, one of its values satisfies the
+    condition. Missing segments and missing values never match.
+
+    Parameters
+    ----------
+    msg_filter : dict
+
+        Keys are locations, typically from the MSH or PID segment, and values
+        are conditions (see get_predicate)
+
+    msgs : list(string) or batch
+
+        A batch (ex. scanner.MsgBatch) is filtered with its own scan, by
+        index, so the same scan can parse the matching messages.
+
+    engine : string, either 'python' (default) or 'numpy'
+
+    Returns
+    -------
+    List(string) of matching messages, in input order, or a
+    scanner.BatchView of the matching messages of a batch
+
+    Examples
+    --------
+    >>> filter_msgs({'MSH.9': 'ADT^A08', 'MSH.4.2': {'Facility A'}}, msgs)
+    >>> filter_msgs({'MSH.7': prefix('2017')}, msgs)
+    '''
+    if is_batch(msgs):
+        batch = msgs
+    else:
+        msgs = list(msgs)
+        batch = MsgBatch(msgs) if engine == 'numpy' else None
+    keep = [True] * len(msgs)
+
+    for loc_txt, cond in msg_filter.items():
+        is_match = get_predicate(cond)
+
+        # python engine only parses messages kept by previous locations
+        if batch is None:
+            kept_idx = list(itertools.compress(range(len(msgs)), keep))
+            vals_per_msg = parse_msgs(loc_txt, [msgs[i] for i in kept_idx])
+        else:
+            kept_idx = range(len(msgs))
+            vals_per_msg = parse_msgs(loc_txt, batch, engine)
+
+        for i, vals in zip(kept_idx, vals_per_msg):
+            keep[i] = keep[i] and vals != ['no_seg'] and any(
+                isinstance(val, str) and is_match(val) for val in vals
+            )
+
+    if batch is msgs:
+        return BatchView(batch, itertools.compress(range(len(msgs)), keep))
+    return list(itertools.compress(msgs, keep))
+
+def iter_filter_msgs(msg_filter, msgs, engine='python', chunk_size=1024):
+    ''' Filter messages lazily, a chunk at a time, see filter_msgs
+
+    Parameters
+    ----------
+    msg_filter : dict
+    msgs : iterable(string)
+    engine : string, either 'python' (default) or 'numpy'
+    chunk_size : int, number of messages filtered at a time
+
+    Yields
+    ------
+    String of each matching message, in input order
+    '''
+    msgs = iter(msgs)
+    for chunk in iter(lambda: list(itertools.islice(msgs, chunk_size)), []):
+        yield from filter_msgs(msg_filter, chunk, engine)
@@ -0,0 +1,147 @@
+'''
+Parent-child segment groups
+'''
+
+import numpy as np
+import pandas as pd
+from tidy_hl7_msgs.parsers import (
+    parse_loc_txt, parse_split, walk_segs, get_seps, get_child_seg
+)
+
+def group_children(parent_seg, segs):
+    ''' Group the child segments of a message with their parent segment
+
+    A child segment's parent is the last parent segment before it.
+
+    Parameters
+    ----------
+    parent_seg : string of parent segment name
+    segs : list(tuple(string, string)) of segment names and segments, in
+        message order (see parsers.walk_segs)
+
+    Returns
+    -------
+    List(tuple) of parent number, parent segment, child number and child
+    segment; one per child segment, plus one per parent segment without
+    children. Numbers count segments from 1 within the message. Missing
+    numbers are NA, and missing segments None.
+
+    Examples
+    --------
+    >>> group_children('OBR', [
+    ...     ('OBR', 'OBR|1'), ('OBX', 'OBX|1'), ('OBX', 'OBX|2'), ('OBR', 'OBR|2')
+    ... ])
+    [(1, 'OBR|1', 1, 'OBX|1'), (1, 'OBR|1', 2, 'OBX|2'), (2, 'OBR|2', nan, None)]
+    '''
+    groups = []
+    parent_n, parent, child_n = np.nan, None, 0
+    has_children = True
+
+    for name, seg in segs:
+        if name == parent_seg:
+            if not has_children:
+                groups.append((parent_n, parent, np.nan, None))
+            parent_n = 1 if parent is None else parent_n + 1
+            parent, has_children = seg, False
+        else:
+            child_n += 1
+            groups.append((parent_n, parent, child_n, seg))
+            has_children = True
+
+    if not has_children:
+        groups.append((parent_n, parent, np.nan, None))
+
+    return groups
+
+def parse_groups(parent_seg, report_locs, msgs, engine='python'):
+    ''' Parse messages at locations of a parent segment and a child segment
+
+    Messages are walked once for both segments, and each segment is split
+    once.
+
+    Parameters
+    ----------
+    parent_seg : string of parent segment name (ex. 'OBR')
+    report_locs : list(string) of locations, from the parent segment and one
+        child segment (ex. 'OBX')
+    msgs : list(string) or batch
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+    Returns
+    -------
+    List(list(list)) of rows per message, where each row holds the parent
+    number, the child number and a value per location. Messages missing both
+    segments have a single row of NAs.
+
+    Examples
+    --------
+    >>> parse_groups('OBR', ['OBR.4.1', 'OBX.3.1', 'OBX.5'], [msg])
+    [[[1, 1, '80048', '2345-7', '98'], [1, 2, '80048', '2160-0', '1.1']]]
+    '''
+    locs = [parse_loc_txt(loc_txt) for loc_txt in report_locs]
+    child_seg = get_child_seg(parent_seg, report_locs)
+    walked = walk_segs([parent_seg, child_seg], msgs, engine)
+
+    rows_per_msg = []
+    for segs, seps in zip(walked, get_seps(msgs)):
+        groups = group_children(parent_seg, segs)
+
+        if not groups:
+            rows_per_msg.append([[np.nan] * (len(locs) + 2)])
+            continue
+
+        rows = []
+        parent_split = {}
+        for parent_n, parent, child_n, child in groups:
+            if parent is not None and parent_n not in parent_split:
+                parent_split[parent_n] = parent.split(seps[0])
+            splits = {
+                parent_seg: parent_split.get(parent_n),
+                child_seg: None if child is None else child.split(seps[0]),
+            }
+            rows.append([parent_n, child_n] + [
+                np.nan if splits[loc['seg']] is None
+                else parse_split(splits[loc['seg']], loc, seps[1])
+                for loc in locs
+            ])
+        rows_per_msg.append(rows)
+
+    return rows_per_msg
+
+def to_groups_cols(msg_ids, rows_per_msg, col_names):
+    ''' Convert parsed groups to columns
+
+    Parameters
+    ----------
+    msg_ids : list(string)
+    rows_per_msg : list(list(list)), as returned by parse_groups
+    col_names : list(string) of column names of locations
+
+    Returns
+    -------
+    Dict of column names and lists of values: 'msg_id', 'parent_seg' and
+    'seg' (the parent and child numbers) and one per location, in message
+    order
+    '''
+    names = ['msg_id', 'parent_seg', 'seg'] + col_names
+    records = [
+        [msg_id] + row
+        for msg_id, rows in zip(msg_ids, rows_per_msg)
+        for row in rows
+    ]
+    return {name: list(vals) for name, vals in zip(names, zip(*records))}
+
+def to_groups_df(msg_ids, rows_per_msg, col_names):
+    ''' Convert parsed groups to a dataframe, see to_groups_cols
+
+    Parameters
+    ----------
+    msg_ids : list(string)
+    rows_per_msg : list(list(list)), as returned by parse_groups
+    col_names : list(string) of column names of locations
+
+    Returns
+    -------
+    Dataframe
+    '''
+    return pd.DataFrame(to_groups_cols(msg_ids, rows_per_msg, col_names))
@@ -3,6 +3,7 @@ Helpers
 '''
 
 import re
+import itertools
 import pandas as pd
 import numpy as np
 
@@ -171,46 +172,38 @@ def zip_msg_ids(lst, msg_ids):
     assert are_lens_equal(msg_ids, lst), "List lengths are not equal"
     return list(zip(msg_ids, lst))
 
-def trim_rows(df, n_segs):
-    ''' Trim expanded rows to equal number of message segments
-
-    Slices message dataframe by rows to equal the number of message segments.
-    If message is missing a segment, single row is returned with a 'seg'
-    value of NA and NAs for all report locations.
+def get_col_names(locs):
+    ''' Column names of locations
 
     Parameters
     ----------
-    df: dataframe
-
-        Message IDs are expected to be identical since this function is
-        applied to a dataframe following a group_by() operation on message
-        IDs
+    locs : list or dict
 
-    n_segs: dict
-
-        Keys are message IDs, and values are either integers for the number of
-        message segments or 'no_seg' if segment is missing
+        If passed a dictionary, its keys must be locations and its values
+        column names
 
     Returns
     -------
-    Dataframe where number of rows equals number of message segments
+    List(string)
+
+    Examples
+    --------
+    >>> get_col_names(['DG1.3.1', 'DG1.6'])
+    ['DG1.3.1', 'DG1.6']
+    >>> get_col_names({'DG1.3.1': 'diag_code', 'DG1.6': 'diag_type'})
+    ['diag_code', 'diag_type']
     '''
-    # pylint: disable=invalid-name
-    msg_ids = set(df['msg_id'])
-    assert len(msg_ids) == 1, 'Message IDs are not identical'
-    msg_id = msg_ids.pop()
-
-    if n_segs[msg_id] == 'no_seg':
-        df_trimmed = df.iloc[:1]
-        df_trimmed.replace('no_seg', np.nan, inplace=True)
-        df_trimmed['seg'] = np.nan
-    else:
-        df_trimmed = df.iloc[:n_segs[msg_id]]
+    try:
+        return [locs[loc] for loc in locs]
+    except TypeError:
+        return list(locs)
 
-    return df_trimmed
+def to_cols(lst, loc_txt):
+    ''' Convert list of zipped values to columns
 
-def to_df(lst, loc_txt):
-    ''' Convert list of zipped values to a dataframe
+    Rows are in the order of the messages, then of their segments. If message
+    is missing a segment, single row is returned with a 'seg' value of NA and
+    an NA for the report location.
 
     Parameters
     ----------
@@ -223,6 +216,83 @@ def to_df(lst, loc_txt):
 
         Location text
 
+    Returns
+    -------
+    Dict of column names and lists of values: 'msg_id', 'seg' and loc_txt
+
+    Examples
+    -------
+    >>> to_cols(
+    ...    [('msg_id1', ['val1']), ('msg_id2', ['val1', 'val2'])],
+    ...    "report_loc"
+    ... )
+    {'msg_id': ['msg_id1', 'msg_id2', 'msg_id2'], 'seg': ['1', '1', '2'],
+     'report_loc': ['val1', 'val1', 'val2']}
+    '''
+    msg_ids, segs, vals = [], [], []
+    for msg_id, msg_vals in lst:
+        if msg_vals[0] == 'no_seg':
+            msg_ids.append(msg_id)
+            segs.append(np.nan)
+            vals.append(np.nan)
+        else:
+            n_segs = len(msg_vals)
+            msg_ids.extend([msg_id] * n_segs)
+            segs.extend(str(n + 1) for n in range(n_segs))
+            vals.extend(msg_vals)
+
+    return {"msg_id": msg_ids, "seg": segs, loc_txt: vals}
+
+def to_split_cols(msg_ids, col_names, elems_per_msg):
+    ''' Convert split segments to columns, one per field or component
+
+    Rows are as returned by to_cols, for all columns at once.
+
+    Parameters
+    ----------
+    msg_ids : list(string)
+    col_names : list(string), one per field or component
+    elems_per_msg : list, as returned by parsers.split_wildcard
+
+    Returns
+    -------
+    Dict of column names and lists of values: 'msg_id', 'seg' and col_names
+
+    Examples
+    -------
+    >>> to_split_cols(
+    ...    ['msg_id1', 'msg_id2'], ['loc.1', 'loc.2'], [[['a', 'b']], None]
+    ... )
+    {'msg_id': ['msg_id1', 'msg_id2'], 'seg': ['1', nan],
+     'loc.1': ['a', nan], 'loc.2': ['b', nan]}
+    '''
+    assert are_lens_equal(msg_ids, elems_per_msg), "List lengths are not equal"
+    msg_id_col, segs = [], []
+    vals = [[] for _ in col_names]
+    for msg_id, msg_elems in zip(msg_ids, elems_per_msg):
+        if msg_elems is None:
+            msg_id_col.append(msg_id)
+            segs.append(np.nan)
+            for col in vals:
+                col.append(np.nan)
+            continue
+
+        for n, elems in enumerate(msg_elems, 1):
+            msg_id_col.append(msg_id)
+            segs.append(str(n))
+            for col, elem in zip(vals, itertools.chain(elems, itertools.repeat(''))):
+                col.append(elem if elem else np.nan)
+
+    return {"msg_id": msg_id_col, "seg": segs, **dict(zip(col_names, vals))}
+
+def to_df(lst, loc_txt):
+    ''' Convert list of zipped values to a dataframe, see to_cols
+
+    Parameters
+    ----------
+    lst : list(tuple(string))
+    loc_txt : string
+
     Returns
     -------
     Dataframe
@@ -236,37 +306,145 @@ def to_df(lst, loc_txt):
        msg_id   seg     report_loc
     0  msg_id1  1       val1
     1  msg_id2  1       val1
-    3  msg_id2  2       val2
+    2  msg_id2  2       val2
     '''
-    # pylint: disable=invalid-name
-    df = pd.DataFrame.from_dict(dict(lst), orient="index")
-
-    n_cols = range(len(df.columns))
-    df.columns = ["{n}".format(n=n+1) for n in n_cols]
-
-    df["msg_id"] = df.index
-    df = pd.melt(df, id_vars=["msg_id"])
-
-    df.rename(
-        columns={
-            "variable": "seg",
-            "value": loc_txt
-        },
-        inplace=True
-    )
-
-    # The number of segments per message is expanded by the from_dict() method
-    # to equal that of the message with the greatest number of segments.  Below
-    # removes these expanded segments/rows.
-    n_segs_per_msg = {}
-    for pair in lst:
-        if pair[1][0] == 'no_seg':
-            n_segs_per_msg[pair[0]] = 'no_seg'
-        else:
-            n_segs_per_msg[pair[0]] = len(pair[1])
+    return pd.DataFrame(to_cols(lst, loc_txt), columns=["msg_id", "seg", loc_txt])
+
+def join_cols(cols_per_loc):
+    ''' Join columns of locations from the same segment
+
+    Locations from the same segment have the same message IDs and segment
+    numbers, row for row, so joining is a matter of collecting their columns.
+    Columns are ordered as by join_dfs, as if each report column were joined
+    on its own.
 
-    df_trimmed = df.groupby("msg_id").apply(trim_rows, n_segs=n_segs_per_msg)
-    return df_trimmed
+    Parameters
+    ----------
+    cols_per_loc : list(dict), as returned by to_cols or to_split_cols
+
+    Returns
+    -------
+    Dict of column names and lists of values
+    '''
+    joined = dict(list(cols_per_loc[0].items())[:2])
+    vals = {}
+    for cols in cols_per_loc:
+        assert cols["msg_id"] == joined["msg_id"], "Rows are not aligned"
+        vals.update(list(cols.items())[2:])
+
+    # order of join_dfs, which joins the first two frames left and appends
+    # the result
+    names = [[name] for cols in cols_per_loc for name in list(cols)[2:]]
+    while len(names) > 1:
+        names = names[2:] + [names[0] + names[1]]
+
+    joined.update((name, vals[name]) for name in flatten(names))
+    return joined
+
+def sort_cols(cols, by):
+    ''' Sort the rows of columns, keeping the order of rows with equal keys
+
+    Parameters
+    ----------
+    cols : dict of column names and lists of values
+    by : list(string) of column names
+
+    Returns
+    -------
+    Dict of column names and lists of values
+
+    Examples
+    --------
+    >>> sort_cols({'msg_id': ['b', 'a'], 'seg': [1.0, 1.0]}, ['msg_id'])
+    {'msg_id': ['a', 'b'], 'seg': [1.0, 1.0]}
+    '''
+    keys = list(zip(*[cols[name] for name in by]))
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return {name: [vals[i] for i in order] for name, vals in cols.items()}
+
+def to_wide_cols(msg_ids, vals_per_loc, locs_txt, max_reps=None):
+    ''' Convert parsed values to columns with one row per message
+
+    Repeated segments are spread into one column per repetition, named
+    <location>_<repetition>. Messages with fewer repetitions, or missing the
+    segment, have NAs in the remaining columns.
+
+    Parameters
+    ----------
+    msg_ids : list(string)
+    vals_per_loc : list(list(list(string)))
+
+        For each location, the parsed values of each message, in the order
+        of msg_ids (see parsers.parse_msgs)
+
+    locs_txt : list(string)
+
+        Location text, one per element of vals_per_loc
+
+    max_reps : int, optional
+
+        Number of repetitions to report; defaults to the greatest number of
+        segments in a message
+
+    Returns
+    -------
+    Dict of column names and lists of values
+
+    Examples
+    -------
+    >>> to_wide_cols(
+    ...     ['msg_id1', 'msg_id2'],
+    ...     [[['val1'], ['val1', 'val2']]],
+    ...     ['report_loc']
+    ... )
+    {'msg_id': ['msg_id1', 'msg_id2'], 'report_loc_1': ['val1', 'val1'],
+     'report_loc_2': [nan, 'val2']}
+    '''
+    if max_reps is None:
+        max_reps = max(
+            [len(vals) for msg_vals in vals_per_loc for vals in msg_vals] + [1]
+        )
+
+    cols = {"msg_id": msg_ids}
+    for loc_txt, msg_vals in zip(locs_txt, vals_per_loc):
+        assert are_lens_equal(msg_ids, msg_vals), "List lengths are not equal"
+        padded = [
+            [np.nan] * max_reps if vals[0] == 'no_seg'
+            else vals[:max_reps] + [np.nan] * (max_reps - len(vals))
+            for vals in msg_vals
+        ]
+        for rep, rep_vals in enumerate(zip(*padded)):
+            cols["{loc}_{rep}".format(loc=loc_txt, rep=rep + 1)] = list(rep_vals)
+
+    return cols
+
+def to_wide_df(msg_ids, vals_per_loc, locs_txt, max_reps=None):
+    ''' Convert parsed values to a dataframe with one row per message, see
+    to_wide_cols
+
+    Parameters
+    ----------
+    msg_ids : list(string)
+    vals_per_loc : list(list(list(string)))
+    locs_txt : list(string)
+    max_reps : int, optional
+
+    Returns
+    -------
+    Dataframe
+
+    Examples
+    -------
+    >>> to_wide_df(
+    ...     ['msg_id1', 'msg_id2'],
+    ...     [[['val1'], ['val1', 'val2']]],
+    ...     ['report_loc']
+    ... )
+        msg_id report_loc_1 report_loc_2
+    0  msg_id1         val1          NaN
+    1  msg_id2         val1         val2
+    '''
+    return pd.DataFrame(to_wide_cols(msg_ids, vals_per_loc, locs_txt, max_reps))
 
 def join_dfs(dfs):
     ''' Join a list of dataframes
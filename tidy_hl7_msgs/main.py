@@ -3,13 +3,24 @@ Tidy HL7 v2 message segments
 '''
 
 import itertools
-import pandas as pd
 from tidy_hl7_msgs.helpers import (
-    to_df, join_dfs, zip_msg_ids, are_segs_identical
+    to_cols, to_split_cols, to_wide_cols, join_cols, sort_cols, zip_msg_ids,
+    are_segs_identical, get_col_names
 )
-from tidy_hl7_msgs.parsers import parse_msgs, parse_msg_id
+from tidy_hl7_msgs.filters import filter_msgs, iter_filter_msgs, NO_MATCHES
+from tidy_hl7_msgs.groups import parse_groups, to_groups_cols
+from tidy_hl7_msgs.outputs import get_builder
+from tidy_hl7_msgs.parsers import (
+    parse_report_locs, parse_msg_id, parse_loc_txt, get_scan_loc, get_child_seg,
+    is_batch, is_wildcard, is_shared_batch, get_shared_batch
+)
+from tidy_hl7_msgs.sampling import head_msgs, sample_msgs
+from tidy_hl7_msgs.scanner import MsgBatch, BatchView
 
-def tidy_segs(msg_id_locs, report_locs, msgs):
+def tidy_segs(msg_id_locs, report_locs, msgs, engine='python', msg_filter=None,
+              preserve_order=False, wide=False, max_reps=None, n_workers=None,
+              parent_seg=None, output='pandas', limit=None, sample=None,
+              seed=None):
     ''' Tidy HL7 message segments
 
     Parameters
@@ -38,14 +49,102 @@ def tidy_segs(msg_id_locs, report_locs, msgs):
         <segment>.<field>.<component>, delinated by a period (ex. 'DG1.4'
         or 'DG1.4.1')
 
+        Wildcard locations report all fields of a segment (ex. 'OBX.*', or
+        'ZPD' for an entire segment) or all components of a field (ex.
+        'OBX.5.*'), expanded to one column per field or component present,
+        named by location (ex. 'OBX.1', 'OBX.2', ...).
+
         If passed a dictionary, its keys must be report locations and its
         values will be corresponding column names in the returned dataframe.
+        Columns of wildcard locations are named by their column name followed
+        by the field or component number.
+
+    msgs : list(string) of HL7 v2 messages, or batch
+
+        Any iterable of messages if limit or sample is given.
+
+        A batch (scanner.MsgBatch, parallel.SharedBatch or cache.CachedBatch)
+        parses its own messages, whatever the engine, and is assumed to be
+        de-duplicated.
+
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+        Parsing engine. The 'numpy' engine packs the messages into a single
+        byte buffer and scans it once for all locations, which is faster for
+        large batches. The 'parallel' engine places this buffer in shared
+        memory and scans slices of it in worker processes, and requires
+        Python 3.8 or later; only the scan is parallel, so it is faster than
+        'numpy' only where scanning dominates, on several CPUs (see
+        parallel.SharedBatch). All engines return identical results.
+
+    msg_filter : dict, optional
+
+        Keys are locations (typically from the MSH or PID segment) and values
+        are conditions: a string to match exactly, a set of strings to match
+        any of, a prefix (see filters.prefix), or a function returning a
+        boolean. Messages not satisfying every condition are dropped before
+        message IDs and report locations are parsed.
+
+    preserve_order : boolean, default False
+
+        If True, messages are reported in the order they first occur in msgs
+        and the sort by message ID and segment is skipped.
+
+    wide : boolean, default False
+
+        If True, one row is returned per message, with repeated segments
+        spread into columns named <report location>_<repetition> (ex.
+        'DG1.3.1_1', 'DG1.3.1_2'). There is no segment number column.
+
+    max_reps : int, optional
+
+        Number of repetitions to report if wide; defaults to the greatest
+        number of segments in a message
+
+    n_workers : int, optional
+
+        Number of worker processes for the 'parallel' engine; defaults to the
+        number of CPUs
+
+    parent_seg : string, optional
+
+        Parent segment (ex. 'OBR'). If given, report locations may be from
+        this segment and from one child segment (ex. 'OBX'), and rows are
+        child segments, each with the values of the last parent segment
+        before it. Segments are numbered within the message: the child in
+        'seg' and its parent in 'parent_seg'. Parent segments without
+        children are reported with a segment number of NA. Messages are
+        walked once for both segments.
+
+    output : string or function, default 'pandas'
+
+        Output backend: 'pandas' for a dataframe, 'numpy' for a structured
+        array with a field of objects per column, 'records' for a list of
+        dicts, or 'arrow' for a pyarrow table (if installed). Otherwise, a
+        function taking a dict of column names and lists of values, whose
+        result is returned. Columns and rows are the same for all backends,
+        and only the pandas backend builds a dataframe.
 
-    msgs : list(string) of HL7 v2 messages
+    limit : int, optional
+
+        Number of messages to report: the first distinct messages (that
+        satisfy the filter, if any). Input is consumed only until enough
+        messages are collected, and only these messages are parsed and
+        sorted.
+
+    sample : int, optional
+
+        Number of messages to report, sampled at random from the input (that
+        satisfy the filter, if any) by reservoir sampling (see
+        sampling.sample_msgs). Only the sample is parsed and sorted.
+
+    seed : int, optional
+
+        Seed of the random sample
 
     Returns
     -------
-    Dataframe
+    Dataframe, or output of the output backend
 
         Columns: one for each message ID/report location and for segment number
 
@@ -56,10 +155,42 @@ def tidy_segs(msg_id_locs, report_locs, msgs):
             If message is missing segment, a single row for this message is
             returned with a segment number of NA and NAs for report locations.
 
+            If wide, one per message. If parent_seg is given, one per child
+            segment.
+
     Raises
     ------
     ValueError if any parameter is empty
-    ValueError if report locations are not from the same segment
+    ValueError if report locations are not from the same segment, or from
+    the parent segment and one child segment if parent_seg is given
+    ValueError if parent_seg is given with wide or wildcard locations
+    ValueError if engine is unknown
+    ValueError if no messages satisfy the filter
+    ValueError if max_reps is less than one
+    ValueError if output is unknown
+    ValueError if both limit and sample are given, or either is less than one
+    '''
+    build = get_builder(output)
+    cols, _, _ = tidy_cols(
+        msg_id_locs, report_locs, msgs, engine=engine, msg_filter=msg_filter,
+        preserve_order=preserve_order, wide=wide, max_reps=max_reps,
+        n_workers=n_workers, parent_seg=parent_seg, limit=limit, sample=sample,
+        seed=seed
+    )
+    return build(cols)
+
+def tidy_cols(msg_id_locs, report_locs, msgs, engine='python', msg_filter=None,
+              preserve_order=False, wide=False, max_reps=None, n_workers=None,
+              parent_seg=None, limit=None, sample=None, seed=None):
+    ''' Tidy HL7 message segments into columns, along with the messages parsed
+
+    Parameters are those of tidy_segs, except output.
+
+    Returns
+    -------
+    Tuple of the dict of column names and lists of values (see tidy_segs),
+    the list of message IDs of the distinct messages parsed, and these
+    messages in the same order (a batch's own messages if given a batch)
     '''
     # pylint: disable=invalid-name
     if not msg_id_locs:
@@ -71,48 +202,146 @@ def tidy_segs(msg_id_locs, report_locs, msgs):
     if not msgs:
         raise ValueError("One of more HL7 v2 messages required")
 
-    if not are_segs_identical(report_locs):
+    if parent_seg is None and not are_segs_identical(report_locs):
         raise ValueError("Report locations must be from the same segment")
 
-    msgs_unique = set(msgs)
-
-    # parse message id locations
-    msg_ids = parse_msg_id(list(msg_id_locs), msgs_unique)
+    if parent_seg is not None:
+        child_seg = get_child_seg(parent_seg, report_locs)
+        if wide or any(map(is_wildcard, report_locs)):
+            raise ValueError(
+                "Wide output and wildcard locations are not supported with a "
+                "parent segment"
+            )
+
+    if max_reps is not None and max_reps < 1:
+        raise ValueError("Maximum number of repetitions must be one or more")
+
+    if limit is not None and sample is not None:
+        raise ValueError("Only one of limit and sample may be given")
+
+    if min(n for n in [limit, sample, 1] if n is not None) < 1:
+        raise ValueError("Limit and sample must be one or more")
+
+    # stop consuming messages once enough are collected
+    if limit is not None or sample is not None:
+        if msg_filter:
+            msgs = iter_filter_msgs(msg_filter, msgs, engine)
+        if limit is not None:
+            msgs = head_msgs(msgs, limit)
+        else:
+            msgs = sample_msgs(msgs, sample, seed)
+        if not msgs:
+            raise ValueError(
+                NO_MATCHES if msg_filter
+                else "One of more HL7 v2 messages required"
+            )
+
+    # messages from head_msgs or sample_msgs are already filtered
+    if limit is not None or sample is not None:
+        msg_filter = None
+
+    # batches (ex. from cache.CachedBatch) are de-duplicated and parse
+    # themselves; otherwise scan once, parse all locations from the scan.
+    # Filtered messages are only de-duplicated once filtered, so messages
+    # dropped by the filter are never hashed
+    is_own_batch = not is_batch(msgs)
+    if is_own_batch:
+        if msg_filter:
+            msgs = list(msgs)
+        elif preserve_order:
+            msgs = list(dict.fromkeys(msgs))
+        else:
+            msgs = list(set(msgs))
+
+        if engine == 'numpy':
+            batch = MsgBatch(msgs)
+        elif engine == 'parallel':
+            batch = get_shared_batch()(msgs, n_workers)
+        else:
+            batch = msgs
+    else:
+        batch = msgs
 
-    # parse report locations
-    report_vals = map(parse_msgs, list(report_locs), itertools.repeat(msgs_unique))
-
-    # zip values for each report location w/ message ids
-    zipped = map(zip_msg_ids, report_vals, itertools.repeat(msg_ids))
-
-    # convert each zipped message id + report value to a dataframe
-    dfs = list(map(to_df, zipped, report_locs))
-
-    # join dataframes
-    df = join_dfs(dfs)
-
-    # for natural sorting by segment, then for pretty printing
-    df['seg'] = df['seg'].astype('float32')
-    df.sort_values(by=['msg_id', 'seg'], inplace=True)
-    df['seg'] = df['seg'].astype('object')
-
-    # cleanup index
-    df.reset_index(drop=True, inplace=True)
-
-    # tidy message ids
-    id_cols = df['msg_id'].str.split(",", expand=True)
-    id_cols.columns = msg_id_locs
-    df = pd.concat([id_cols, df], axis=1).drop(['msg_id'], axis=1)
-
-    # rename columns if locs are dicts
     try:
-        df.rename(columns=msg_id_locs, inplace=True)
-    except TypeError:
-        pass
+        # parse all locations in a single round of worker tasks
+        if is_shared_batch(batch):
+            if parent_seg is None:
+                scan_locs = [get_scan_loc(parse_loc_txt(loc)) for loc in report_locs]
+            else:
+                scan_locs = [{'seg': seg, 'depth': 1} for seg in [parent_seg, child_seg]]
+            batch.prefetch([
+                parse_loc_txt(loc_txt)
+                for loc_txt in itertools.chain(msg_filter or [], msg_id_locs)
+            ] + scan_locs)
+
+        # filter by index, so the scan of the batch also parses the matches
+        msgs_unique = batch
+        if msg_filter:
+            msgs_unique = filter_msgs(msg_filter, batch, engine)
+            if not msgs_unique:
+                raise ValueError(NO_MATCHES)
+
+            # de-duplicate matches by index, keeping their first occurrence
+            if is_own_batch and is_batch(msgs_unique):
+                first = {}
+                for i in msgs_unique.idx:
+                    first.setdefault(msgs[i], i)
+                msgs_unique = BatchView(batch, first.values())
+            elif is_own_batch:
+                msgs_unique = list(dict.fromkeys(msgs_unique))
+
+        # messages parsed, as strings where they are at hand
+        if not is_own_batch or not is_batch(msgs_unique):
+            msgs_parsed = msgs_unique
+        elif isinstance(msgs_unique, BatchView):
+            msgs_parsed = [msgs[i] for i in msgs_unique.idx]
+        else:
+            msgs_parsed = msgs
+
+        # parse message id locations
+        msg_ids = parse_msg_id(list(msg_id_locs), msgs_unique, engine)
+
+        # parse report locations, named by their column names
+        if parent_seg is None:
+            report_vals = parse_report_locs(
+                report_locs, msgs_unique, engine, split_wildcards=not wide
+            )
+        else:
+            report_rows = parse_groups(parent_seg, list(report_locs), msgs_unique, engine)
+    finally:
+        if is_shared_batch(batch) and is_own_batch:
+            batch.close()
+
+    if parent_seg is not None:
+        cols = to_groups_cols(msg_ids, report_rows, get_col_names(report_locs))
+
+        # rows are already in message order, then walk order
+        sort_by = ['msg_id']
+    elif wide:
+        cols = to_wide_cols(msg_ids, list(report_vals.values()), list(report_vals), max_reps)
+        sort_by = ['msg_id']
+    else:
+        # convert each report location to columns, zipping its values w/
+        # message ids, or the split segments of a wildcard all at once
+        cols = join_cols([
+            to_split_cols(msg_ids, *vals) if isinstance(vals, tuple)
+            else to_cols(zip_msg_ids(vals, msg_ids), name)
+            for name, vals in report_vals.items()
+        ])
+
+        # for natural sorting by segment; rows are already in message order,
+        # then segment order
+        cols['seg'] = [float(seg) for seg in cols['seg']]
+        sort_by = ['msg_id', 'seg']
+
+    if not preserve_order:
+        cols = sort_cols(cols, sort_by)
 
-    try:
-        df.rename(columns=report_locs, inplace=True)
-    except TypeError:
-        pass
+    # tidy message ids
+    id_names = get_col_names(msg_id_locs)
+    id_vals = [msg_id.split(",") for msg_id in cols.pop('msg_id')]
+    if any(len(vals) != len(id_names) for vals in id_vals):
+        raise ValueError("Message ID values must not contain commas")
+    id_cols = dict(zip(id_names, map(list, zip(*id_vals))))
 
-    return df
+    return {**id_cols, **cols}, msg_ids, msgs_parsed
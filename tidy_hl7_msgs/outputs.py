@@ -0,0 +1,117 @@
+'''
+Output backends
+'''
+
+import numpy as np
+import pandas as pd
+
+def to_pandas(cols):
+    ''' Dataframe of columns, each of objects
+
+    Segment numbers, and columns without any values (all NAs), are objects
+    like other columns rather than floats.
+
+    Parameters
+    ----------
+    cols : dict of column names and lists of values
+
+    Returns
+    -------
+    Dataframe
+    '''
+    return pd.DataFrame(cols, dtype=object)
+
+def to_numpy(cols):
+    ''' Structured array of columns, with a field of objects per column
+
+    Parameters
+    ----------
+    cols : dict of column names and lists of values
+
+    Returns
+    -------
+    Numpy structured array
+    '''
+    n_rows = len(next(iter(cols.values()), []))
+    arr = np.empty(n_rows, dtype=[(name, object) for name in cols])
+    for name, vals in cols.items():
+        arr[name] = np.array(vals, dtype=object)
+    return arr
+
+def to_records(cols):
+    ''' Records of columns
+
+    Parameters
+    ----------
+    cols : dict of column names and lists of values
+
+    Returns
+    -------
+    List(dict) of column names and values, one per row
+    '''
+    names = list(cols)
+    return [dict(zip(names, row)) for row in zip(*cols.values())]
+
+def to_arrow(cols):
+    ''' Arrow table of columns, with NAs as nulls
+
+    Parameters
+    ----------
+    cols : dict of column names and lists of values
+
+    Returns
+    -------
+    pyarrow.Table
+
+    Raises
+    ------
+    ImportError if pyarrow is not installed
+    '''
+    try:
+        import pyarrow as pa # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise ImportError("Arrow output requires pyarrow") from err
+
+    return pa.table(
+        {name: pa.array(vals, from_pandas=True) for name, vals in cols.items()}
+    )
+
+OUTPUTS = {
+    'pandas': to_pandas,
+    'numpy': to_numpy,
+    'records': to_records,
+    'arrow': to_arrow,
+}
+
+def get_builder(output):
+    ''' Builder of output from columns
+
+    Parameters
+    ----------
+    output : string or function
+
+        One of 'pandas', 'numpy', 'records' or 'arrow', or a function taking
+        a dict of column names and lists of values
+
+    Returns
+    -------
+    Function
+
+    Raises
+    ------
+    ValueError if output is unknown
+
+    Examples
+    --------
+    >>> get_builder('records')({'msg_id': ['a', 'b'], 'seg': [1.0, 1.0]})
+    [{'msg_id': 'a', 'seg': 1.0}, {'msg_id': 'b', 'seg': 1.0}]
+    '''
+    if callable(output):
+        return output
+    if output in OUTPUTS:
+        return OUTPUTS[output]
+    raise ValueError(
+        "Output must be one of {outputs}, or a function: {output}".format(
+            outputs=", ".join(OUTPUTS), output=output
+        )
+    )
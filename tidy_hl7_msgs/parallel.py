@@ -0,0 +1,280 @@
+'''
+Parallel parsing over shared memory
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from tidy_hl7_msgs.scanner import MsgBatch, group_vals, group_segs
+
+# worker pools by number of workers, shared by batches
+EXECUTORS = {}
+
+def get_executor(n_workers):
+    ''' Pool of worker processes, started on first use and then reused by
+    later batches, so workers are not started again for each batch
+
+    Parameters
+    ----------
+    n_workers : int
+
+    Returns
+    -------
+    ProcessPoolExecutor
+    '''
+    if n_workers not in EXECUTORS:
+        EXECUTORS[n_workers] = ProcessPoolExecutor(max_workers=n_workers)
+    return EXECUTORS[n_workers]
+
+def locate_slice(buf_name, ends_name, n_msgs, msg_start, msg_end, locs):
+    ''' Locate values of a slice of messages held in shared memory
+
+    Runs in a worker process. The slice is scanned in place, and located
+    positions are returned through a new shared memory block per location.
+
+    Parameters
+    ----------
+    buf_name : string, name of shared memory holding the encoded messages
+    ends_name : string, name of shared memory holding message end offsets
+    n_msgs : int, number of messages in shared memory
+    msg_start, msg_end : int, bounds of the slice of messages
+    locs : list(dict) of location attributes and values
+
+    Returns
+    -------
+    List(tuple(string, int)) of shared memory names and number of located
+    values, one per location. Each block holds an int64 array of shape
+    (4, n): message indices, value start positions, value end positions and
+    whether the value is present, relative to the whole batch.
+    '''
+    buf_shm = SharedMemory(name=buf_name)
+    ends_shm = SharedMemory(name=ends_name)
+
+    # drop the traceback on error, since its frames hold views of shared
+    # memory that would prevent closing it
+    error = None
+    try:
+        results = locate_in(buf_shm, ends_shm, n_msgs, msg_start, msg_end, locs)
+    except Exception as err: # pylint: disable=broad-except
+        error = err.with_traceback(None)
+
+    buf_shm.close()
+    ends_shm.close()
+
+    if error is not None:
+        raise error
+    return results
+
+def locate_in(buf_shm, ends_shm, n_msgs, msg_start, msg_end, locs):
+    ''' Body of locate_slice, so that views of shared memory are released
+    before it is closed '''
+    ends = np.ndarray((n_msgs,), dtype=np.int64, buffer=ends_shm.buf)
+    byte_start = int(ends[msg_start - 1]) if msg_start else 0
+    byte_end = int(ends[msg_end - 1])
+
+    buf = np.ndarray((byte_end,), dtype=np.uint8, buffer=buf_shm.buf)[byte_start:]
+    lens = np.diff(ends[msg_start:msg_end], prepend=byte_start)
+    batch = MsgBatch.from_buffer(buf, lens)
+
+    results = []
+    for loc in locs:
+        msg_idx, starts, val_ends, has_val = batch.locate(loc)
+
+        out_shm = SharedMemory(create=True, size=max(32 * len(msg_idx), 1))
+        out = np.ndarray((4, len(msg_idx)), dtype=np.int64, buffer=out_shm.buf)
+        out[0] = msg_idx + msg_start
+        out[1] = starts + byte_start
+        out[2] = val_ends + byte_start
+        out[3] = has_val
+        del out
+        out_shm.close()
+
+        results.append((out_shm.name, len(msg_idx)))
+
+    return results
+
+def read_located(name, n_vals):
+    ''' Copy located positions out of a worker's shared memory and free it '''
+    shm = SharedMemory(name=name)
+    try:
+        located = np.ndarray((4, n_vals), dtype=np.int64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return located
+
+class SharedBatch:
+    ''' Batch of HL7 messages parsed in parallel over shared memory
+
+    The messages are encoded one at a time into a shared memory block, along
+    with an array of message end offsets, so no other copy of the whole batch
+    is held. Worker processes scan their slice of messages in place (see
+    scanner.MsgBatch) and return located value positions through shared
+    arrays, so neither messages nor parsed values are pickled.
+
+    Only the scan is parallel. Encoding the messages and materializing
+    parsed values as strings happen in this process, and grow with the
+    batch as they do for the 'numpy' engine, since strings cannot be shared
+    between processes without pickling them. The engine therefore speeds up
+    batches where scanning dominates (many locations, long messages, few
+    values per message) on several CPUs, and is slower than the 'numpy'
+    engine with few CPUs. Worker processes are started on first use and
+    reused by later batches (see get_executor).
+
+    Use as a context manager, or call close(), to free the shared memory.
+
+    Parameters
+    ----------
+    msgs : list(string) of HL7 v2 messages
+    n_workers : int, optional
+
+        Number of worker processes; defaults to the number of CPUs
+
+    Examples
+    --------
+    >>> with SharedBatch(msgs, n_workers=4) as batch:
+    ...     batch.prefetch([parse_loc_txt('MSH.7'), parse_loc_txt('DG1.3.1')])
+    ...     batch.parse(parse_loc_txt('DG1.3.1'))
+    '''
+    def __init__(self, msgs, n_workers=None):
+        msgs = list(msgs)
+        self.n_msgs = len(msgs)
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.located = {}
+
+        # encoded lengths, without holding encoded copies of the messages
+        lens = np.fromiter(
+            (len(msg) if msg.isascii() else len(msg.encode('utf-8')) for msg in msgs),
+            dtype=np.int64, count=self.n_msgs
+        )
+        ends = np.cumsum(lens)
+        self.starts = ends - lens
+
+        # each message is encoded straight into shared memory
+        self.buf_shm = SharedMemory(create=True, size=max(int(lens.sum()), 1))
+        for msg, start, end in zip(msgs, self.starts.tolist(), ends.tolist()):
+            self.buf_shm.buf[start:end] = msg.encode('utf-8')
+        self.ends_shm = SharedMemory(create=True, size=max(ends.nbytes, 1))
+        self.ends_shm.buf[:ends.nbytes] = ends.tobytes()
+
+        bounds = np.linspace(0, self.n_msgs, min(self.n_workers, self.n_msgs) + 1)
+        bounds = bounds.astype(int).tolist()
+        self.slices = list(zip(bounds[:-1], bounds[1:]))
+
+        self.executor = get_executor(self.n_workers)
+
+    def __len__(self):
+        return self.n_msgs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        ''' Free shared memory; workers are kept for later batches '''
+        self.buf_shm.close()
+        self.buf_shm.unlink()
+        self.ends_shm.close()
+        self.ends_shm.unlink()
+
+    def get_seps(self):
+        ''' Field and component separators of each message '''
+        return [
+            str(self.buf_shm.buf[start + 3:start + 5], 'utf-8')
+            for start in self.starts.tolist()
+        ]
+
+    def get_raw(self):
+        ''' Shared memory of the encoded messages, which located positions index '''
+        return self.buf_shm.buf
+
+    def prefetch(self, locs):
+        ''' Parse several locations in a single round of worker tasks
+
+        Parameters
+        ----------
+        locs : list(dict) of location attributes and values
+        '''
+        keys = [tuple(sorted(loc.items())) for loc in locs]
+        todo = {key: loc for key, loc in zip(keys, locs) if key not in self.located}
+        if not todo:
+            return
+
+        futures = [
+            self.executor.submit(
+                locate_slice,
+                self.buf_shm.name, self.ends_shm.name, self.n_msgs,
+                msg_start, msg_end, list(todo.values())
+            )
+            for msg_start, msg_end in self.slices
+        ]
+        # collect all results before raising, so no shared memory is leaked
+        results = [future.exception() or future.result() for future in futures]
+        errors = [result for result in results if isinstance(result, Exception)]
+        located = [
+            [read_located(name, n_vals) for name, n_vals in result]
+            for result in results if not isinstance(result, Exception)
+        ]
+        if errors:
+            # a broken pool cannot run later tasks, so start another next time
+            if any(isinstance(err, BrokenProcessPool) for err in errors):
+                EXECUTORS.pop(self.n_workers, None)
+            raise errors[0]
+
+        for i, key in enumerate(todo):
+            self.located[key] = np.concatenate(
+                [slice_located[i] for slice_located in located]
+                + [np.empty((4, 0), dtype=np.int64)],
+                axis=1
+            )
+
+    def locate(self, loc):
+        ''' Locate values of all messages at a given location
+
+        Parameters
+        ----------
+        loc : dict of location attributes and values
+
+        Returns
+        -------
+        Int64 array of shape (4, n), see locate_slice
+        '''
+        self.prefetch([loc])
+        return self.located[tuple(sorted(loc.items()))]
+
+    def parse(self, loc):
+        ''' Parse all messages at a given location
+
+        Parameters
+        ----------
+        loc : dict of location attributes and values
+
+        Returns
+        -------
+        List(list(string)), as returned by parsers.parse_msgs
+        '''
+        located = self.locate(loc)
+        return group_vals(
+            self.get_raw(), self.n_msgs, *located[:3], located[3].astype(bool)
+        )
+
+    def parse_segs(self, segs):
+        ''' Walk messages for segments of several types, in message order
+
+        Parameters
+        ----------
+        segs : list(string) of segment names
+
+        Returns
+        -------
+        List(list(tuple(string, string))), as returned by parsers.walk_segs
+        '''
+        locs = [{'seg': seg, 'depth': 1} for seg in segs]
+        self.prefetch(locs)
+        return group_segs(
+            self.get_raw(), self.n_msgs, segs, [self.locate(loc)[:3] for loc in locs]
+        )
@@ -3,23 +3,72 @@ Parsers
 '''
 
 import re
+import sys
 import itertools
 import numpy as np
 import pandas as pd
-from tidy_hl7_msgs.helpers import concat, flatten
+from tidy_hl7_msgs.helpers import concat, flatten, get_col_names
+from tidy_hl7_msgs.cache import CachedBatch
+from tidy_hl7_msgs.scanner import MsgBatch, BatchView
 
-def parse_msgs(loc_txt, msgs):
+ENGINES = ['python', 'numpy', 'parallel']
+BATCHES = (MsgBatch, CachedBatch, BatchView)
+
+def get_shared_batch():
+    ''' parallel.SharedBatch, imported on first use since shared memory
+    requires Python 3.8 or later '''
+    from tidy_hl7_msgs.parallel import SharedBatch # pylint: disable=import-outside-toplevel
+    return SharedBatch
+
+def is_shared_batch(msgs):
+    ''' Are messages a parallel.SharedBatch?
+
+    Checked without importing the parallel module, since no shared batch
+    exists unless it was imported.
+    '''
+    parallel = sys.modules.get('tidy_hl7_msgs.parallel')
+    return parallel is not None and isinstance(msgs, parallel.SharedBatch)
+
+def is_batch(msgs):
+    ''' Are messages a batch that parses itself (ex. MsgBatch)?
+
+    Parameters
+    ----------
+    msgs : list(string) or batch
+
+    Returns
+    -------
+    Boolean
+    '''
+    return isinstance(msgs, BATCHES) or is_shared_batch(msgs)
+
+def parse_msgs(loc_txt, msgs, engine='python'):
     ''' Parse messages at a given location
 
     Parameters
     ----------
     loc_txt : string of location to parse
-    msgs : list(string)
+    msgs : list(string) or batch (MsgBatch, SharedBatch or CachedBatch)
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+        The 'numpy' engine scans the whole batch of messages at once (see
+        scanner.MsgBatch) and returns identical results.
+
+        The 'parallel' engine splits this scan across worker processes over
+        shared memory (see parallel.SharedBatch).
+
+        Batches parse themselves whatever the engine, reusing their scan (or
+        cache, see cache.CachedBatch) across locations.
 
     Returns
     -------
     List(list(string))
 
+    Raises
+    ------
+    ValueError if engine is unknown
+    ValueError if location is a wildcard (see parse_wildcard)
+
     Examples
     --------
     >>> msg1 = '...AL1|3|DA|1545^MORPHINE^99HIC|||20080828|||...'
@@ -34,13 +83,52 @@ def parse_msgs(loc_txt, msgs):
     >>> parse_msgs("AL1.3.1", [msg1, msg3])
     >>> [['1545'], ['00000741', '00001433']]
     '''
+    if engine not in ENGINES:
+        raise ValueError(
+            "Engine must be one of: {engines}".format(engines=", ".join(ENGINES))
+        )
+
     loc = parse_loc_txt(loc_txt)
+
+    if loc.get('wildcard'):
+        raise ValueError("Wildcard locations must be parsed by parse_wildcard")
+
+    return parse_loc(loc, msgs, engine)
+
+def parse_loc(loc, msgs, engine='python'):
+    ''' Parse messages at a given parsed location, see parse_msgs
+
+    Parameters
+    ----------
+    loc : dict of location attributes and values
+    msgs : list(string) or batch
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+    Returns
+    -------
+    List(list(string))
+    '''
+    if is_batch(msgs):
+        return msgs.parse(loc)
+
+    if engine == 'numpy':
+        return MsgBatch(msgs).parse(loc)
+
+    if engine == 'parallel':
+        with get_shared_batch()(msgs) as batch:
+            return batch.parse(loc)
+
     parser = get_parser(loc)
     return list(map(parser, msgs))
 
 def parse_loc_txt(loc_txt):
     ''' Parse HL7 message location
 
+    A location whose last element is '*' is a wildcard for all fields of a
+    segment (ex. 'OBX.*') or all components of a field (ex. 'OBX.5.*'). A
+    segment on its own (ex. 'ZPD') is a wildcard for all its fields. See
+    parse_wildcard.
+
     Parameters
     ----------
     loc_txt : string of location
@@ -60,29 +148,108 @@ def parse_loc_txt(loc_txt):
     >>>
     >>> parse_loc_txt('DG1.3.1')
     {'seg': 'DG1', 'field': 3, 'comp': 0, 'depth': 3}
+    >>>
+    >>> parse_loc_txt('OBX.5.*')
+    {'seg': 'OBX', 'field': 5, 'depth': 3, 'wildcard': True}
 
     '''
     loc = {}
     loc_split = loc_txt.split(".")
+
+    # entire segment
+    if len(loc_split) == 1:
+        loc_split.append('*')
+
     loc['depth'] = len(loc_split)
 
     if loc['depth'] not in [2, 3]:
         raise ValueError(
-            "Syntax of location must be either <segment>.<field> or "
-            "<segment>.<field>.<component>"
+            "Syntax of location must be either <segment>, <segment>.<field> "
+            "or <segment>.<field>.<component>, where the last element may "
+            "be '*'"
         )
 
     loc['seg'] = loc_split[0]
-    loc['field'] = int(loc_split[1])
 
-    if loc['seg'] == "MSH":
-        loc['field'] -= 1
+    if loc_split[-1] == '*':
+        loc['wildcard'] = True
 
-    if loc['depth'] == 3:
+    if loc['depth'] == 3 or not loc.get('wildcard'):
+        loc['field'] = int(loc_split[1])
+
+        if loc['seg'] == "MSH":
+            loc['field'] -= 1
+
+    if loc['depth'] == 3 and not loc.get('wildcard'):
         loc['comp'] = int(loc_split[2]) - 1
 
     return loc
 
+def get_scan_loc(loc):
+    ''' Location to parse for a location, i.e. the entire segment if wildcard
+
+    Parameters
+    ----------
+    loc : dict of location attributes and values
+
+    Returns
+    -------
+    Dictionary of location attributes and values, with a depth of 1 for an
+    entire segment
+    '''
+    if loc.get('wildcard'):
+        return {'seg': loc['seg'], 'depth': 1}
+    return loc
+
+def is_wildcard(loc_txt):
+    ''' Is location a wildcard?
+
+    Parameters
+    ----------
+    loc_txt : string of location
+
+    Returns
+    -------
+    Boolean
+
+    Examples
+    --------
+    >>> is_wildcard('OBX.*')
+    True
+    >>> is_wildcard('OBX.5.1')
+    False
+    '''
+    return parse_loc_txt(loc_txt).get('wildcard', False)
+
+def parse_split(seg_split, loc, comp_sep):
+    ''' Parse a segment, already split into fields, at a given location
+
+    Parameters
+    ----------
+    seg_split : list(string) of segment fields, including segment name
+    loc : dict of location attributes and values
+    comp_sep : string, component separator
+
+    Returns
+    -------
+    String, or NA if missing
+
+    Examples
+    --------
+    >>> seg = 'AL1|3|DA|1545^MORPHINE^99HIC|||20080828'
+    >>> parse_split(seg.split('|'), parse_loc_txt('AL1.3.2'), '^')
+    'MORPHINE'
+    '''
+    try:
+        val = seg_split[loc['field']]
+        if loc['depth'] == 3:
+            val = val.split(comp_sep)[loc['comp']]
+    except IndexError:
+        val = np.nan
+
+    # if sep present for split but no data (i.e empty string)
+    return val if val else np.nan
+
 def get_parser(loc):
     ''' Higher-order function to parse a location from an HL7 message
 
@@ -90,6 +257,8 @@ def get_parser(loc):
     ----------
     loc : dict of location attributes and values
 
+        A depth of 1 parses the entire segment
+
     Returns
     -------
     Function to parse an HL7 message at a given location
@@ -122,7 +291,6 @@ def get_parser(loc):
         -------
         List(string)
         '''
-        # pylint: disable=expression-not-assigned
         field_sep, comp_sep = list(msg)[3:5]
 
         seg_re = loc['seg'] + re.escape(field_sep) + '.*(?=\\n)'
@@ -130,30 +298,278 @@ def get_parser(loc):
 
         if not segs:
             data = ['no_seg']
+        elif loc['depth'] == 1:
+            data = segs
         else:
-            data = []
-            for seg in segs:
-                seg_split = seg.split(field_sep)
-                if loc['depth'] == 2:
-                    try:
-                        field_val = seg_split[loc['field']]
-                    except IndexError:
-                        field_val = np.nan
-                    # if sep present for split but no data (i.e empty string)
-                    data.append(field_val) if field_val else data.append(np.nan)
-                else:
-                    assert loc['depth'] == 3
-                    try:
-                        field_val = seg_split[loc['field']]
-                        comp_val = field_val.split(comp_sep)[loc['comp']]
-                    except IndexError:
-                        comp_val = np.nan
-                    # if sep present for split but no data (i.e empty string)
-                    data.append(comp_val) if comp_val else data.append(np.nan)
+            data = [parse_split(seg.split(field_sep), loc, comp_sep) for seg in segs]
         return data
     return parser
 
-def parse_msg_id(id_locs_txt, msgs):
+def get_seg_walker(segs):
+    ''' Higher-order function to walk the segments of an HL7 message
+
+    Parameters
+    ----------
+    segs : list(string) of segment names
+
+    Returns
+    -------
+    Function returning, for an HL7 message, a list of tuples of segment name
+    and segment, in message order
+
+    Examples
+    --------
+    >>> walk = get_seg_walker(['OBR', 'OBX'])
+    >>> walk(msg)
+    [('OBR', 'OBR|1|...'), ('OBX', 'OBX|1|...'), ('OBX', 'OBX|2|...')]
+    '''
+    def walker(msg):
+        field_sep = msg[3]
+        seg_re = '(' + '|'.join(segs) + ')' + re.escape(field_sep) + '.*(?=\\n)'
+        return [(match.group(1), match.group(0)) for match in re.finditer(seg_re, msg)]
+    return walker
+
+def walk_segs(segs, msgs, engine='python'):
+    ''' Walk messages once for segments of several types, in message order
+
+    Parameters
+    ----------
+    segs : list(string) of segment names
+    msgs : list(string) or batch
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+    Returns
+    -------
+    List(list(tuple(string, string))) of segment names and segments, one
+    list per message, empty if message has none of the segments
+    '''
+    if is_batch(msgs):
+        return msgs.parse_segs(segs)
+
+    if engine == 'numpy':
+        return MsgBatch(msgs).parse_segs(segs)
+
+    if engine == 'parallel':
+        with get_shared_batch()(msgs) as batch:
+            return batch.parse_segs(segs)
+
+    return list(map(get_seg_walker(segs), msgs))
+
+def get_child_seg(parent_seg, locs_txt):
+    ''' Child segment of locations grouped under a parent segment
+
+    Parameters
+    ----------
+    parent_seg : string of parent segment name
+    locs_txt : list(string) of locations
+
+    Returns
+    -------
+    String of child segment name
+
+    Raises
+    ------
+    ValueError if locations are not from the parent segment and one other
+    segment
+
+    Examples
+    --------
+    >>> get_child_seg('OBR', ['OBR.4.1', 'OBX.3.1', 'OBX.5'])
+    'OBX'
+    '''
+    segs = {parse_loc_txt(loc_txt)['seg'] for loc_txt in locs_txt} - {parent_seg}
+    if len(segs) != 1:
+        raise ValueError(
+            "Report locations must be from the parent segment and one child segment"
+        )
+    return segs.pop()
+
+def get_seps(msgs):
+    ''' Field and component separators of each message
+
+    Parameters
+    ----------
+    msgs : list(string) or batch
+
+    Returns
+    -------
+    List(string) of two characters per message
+    '''
+    if is_batch(msgs):
+        return msgs.get_seps()
+    return [msg[3:5] for msg in msgs]
+
+def split_wildcard(loc_txt, msgs, engine='python'):
+    ''' Split each segment once at a wildcard location, into fields or
+    components
+
+    Locations are expanded to every field or component present in any
+    message, from the first (ex. 'OBX.1') to the last. The MSH segment is
+    expanded from 'MSH.2', since its first field is the field separator.
+
+    Parameters
+    ----------
+    loc_txt : string of wildcard location (ex. 'OBX.*', 'OBX.5.*' or 'ZPD')
+    msgs : list(string) or batch
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+    Returns
+    -------
+    Tuple of expanded locations, as a list(string), and the split segments
+    of each message, as a list of None if the message is missing the segment
+    or else of a list(string) of fields or components per segment
+
+    Raises
+    ------
+    ValueError if location is not a wildcard
+
+    Examples
+    --------
+    >>> split_wildcard('AL1.3.*', [msg1, msg2])
+    (['AL1.3.1', 'AL1.3.2', 'AL1.3.3'],
+     [[['1545', 'MORPHINE', '99HIC']], [['00000741', 'OXYCODONE']]])
+    '''
+    loc = parse_loc_txt(loc_txt)
+    if not loc.get('wildcard'):
+        raise ValueError("Location must be a wildcard")
+
+    segs_per_msg = parse_loc(get_scan_loc(loc), msgs, engine)
+
+    elems_per_msg = []
+    for segs, seps in zip(segs_per_msg, get_seps(msgs)):
+        if segs == ['no_seg']:
+            elems_per_msg.append(None)
+            continue
+        elems = []
+        for seg in segs:
+            seg_split = seg.split(seps[0])
+            if loc['depth'] == 3:
+                try:
+                    seg_split = seg_split[loc['field']].split(seps[1])
+                except IndexError:
+                    seg_split = []
+            else:
+                # drop segment name
+                seg_split = seg_split[1:]
+            elems.append(seg_split)
+        elems_per_msg.append(elems)
+
+    n_elems = max(
+        [len(elems) for msg_elems in elems_per_msg if msg_elems for elems in msg_elems]
+        + [1]
+    )
+
+    if loc['depth'] == 3:
+        prefix, first = loc_txt.rsplit(".", 1)[0], 1
+    else:
+        prefix, first = loc['seg'], 2 if loc['seg'] == "MSH" else 1
+
+    exp_txts = [
+        "{prefix}.{n}".format(prefix=prefix, n=i + first) for i in range(n_elems)
+    ]
+    return exp_txts, elems_per_msg
+
+def get_elem_vals(elems_per_msg, idx):
+    ''' Values of the idx-th field or component of split segments
+
+    Parameters
+    ----------
+    elems_per_msg : list, as returned by split_wildcard
+    idx : int
+
+    Returns
+    -------
+    List(list(string)), as returned by parse_msgs
+    '''
+    return [
+        ['no_seg'] if msg_elems is None else [
+            elems[idx] if idx < len(elems) and elems[idx] else np.nan
+            for elems in msg_elems
+        ]
+        for msg_elems in elems_per_msg
+    ]
+
+def parse_wildcard(loc_txt, msgs, engine='python'):
+    ''' Parse messages at all fields of a segment, or all components of a field
+
+    Each segment is parsed once as a whole, then split once (see
+    split_wildcard).
+
+    Parameters
+    ----------
+    loc_txt : string of wildcard location (ex. 'OBX.*', 'OBX.5.*' or 'ZPD')
+    msgs : list(string) or batch
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+    Returns
+    -------
+    Dictionary, where keys are expanded locations and values are parsed
+    values, as returned by parse_msgs for each location
+
+    Raises
+    ------
+    ValueError if location is not a wildcard
+
+    Examples
+    --------
+    >>> parse_wildcard('AL1.3.*', [msg1, msg2])
+    {'AL1.3.1': [['1545'], ['00000741']],
+     'AL1.3.2': [['MORPHINE'], ['OXYCODONE']],
+     'AL1.3.3': [['99HIC'], [nan]]}
+    '''
+    exp_txts, elems_per_msg = split_wildcard(loc_txt, msgs, engine)
+
+    return {
+        exp_txt: get_elem_vals(elems_per_msg, i) for i, exp_txt in enumerate(exp_txts)
+    }
+
+def parse_report_locs(report_locs, msgs, engine='python', split_wildcards=False):
+    ''' Parse messages at report locations, expanding wildcards
+
+    Parameters
+    ----------
+    report_locs : list or dict
+
+        If passed a dictionary, its keys must be locations and its values
+        column names. Columns of a wildcard location are named by its column
+        name (without any trailing '.*') followed by the field or component
+        number (ex. 'OBX.*' as 'OBX.1', 'OBX.2', ... or, if named 'obs',
+        'obs.1', 'obs.2', ...).
+
+    msgs : list(string) or batch
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+    split_wildcards : boolean, default False
+
+        If True, wildcard locations are not expanded into parsed values per
+        column, but keyed by their column name (without any trailing '.*')
+        with a tuple of their column names and split segments (see
+        split_wildcard, and helpers.to_split_cols)
+
+    Returns
+    -------
+    Dictionary, where keys are column names and values are parsed values, as
+    returned by parse_msgs
+    '''
+    parsed = {}
+    for loc_txt, name in zip(list(report_locs), get_col_names(report_locs)):
+        if not is_wildcard(loc_txt):
+            parsed[name] = parse_msgs(loc_txt, msgs, engine)
+            continue
+
+        prefix = re.sub('\\.\\*$', '', name)
+        exp_txts, elems_per_msg = split_wildcard(loc_txt, msgs, engine)
+        cols = [
+            "{prefix}.{n}".format(prefix=prefix, n=exp_txt.rsplit(".", 1)[1])
+            for exp_txt in exp_txts
+        ]
+        if split_wildcards:
+            parsed[prefix] = (cols, elems_per_msg)
+            continue
+        for i, col in enumerate(cols):
+            parsed[col] = get_elem_vals(elems_per_msg, i)
+    return parsed
+
+def parse_msg_id(id_locs_txt, msgs, engine='python'):
     ''' Parse message IDs from raw HL7 messages
 
     The message identifier is a concatination of the each ID location value,
@@ -166,7 +582,8 @@ def parse_msg_id(id_locs_txt, msgs):
     Parameters
     ----------
     id_locs_txt : list(string)
-    msgs : list(string)
+    msgs : list(string) or batch (MsgBatch, SharedBatch or CachedBatch)
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
 
     Returns
     -------
@@ -184,7 +601,9 @@ def parse_msg_id(id_locs_txt, msgs):
     >>> parse_msg_id(['MSH.7', 'PID.3.1', 'PID.3.4'], msgs)
     ['Facility1,68188,1719801063', 'Facility2,588229,1721309017']
     '''
-    ids_per_seg = list(map(parse_msgs, id_locs_txt, itertools.repeat(msgs)))
+    ids_per_seg = list(map(
+        parse_msgs, id_locs_txt, itertools.repeat(msgs), itertools.repeat(engine)
+    ))
     ids_per_msg = [np.array(flatten(msg_ids), dtype=object) for msg_ids in ids_per_seg]
 
     # id segment is missing
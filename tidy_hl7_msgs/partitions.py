@@ -0,0 +1,348 @@
+'''
+Partitioned processing of HL7 message files
+'''
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from tidy_hl7_msgs.filters import NO_MATCHES
+from tidy_hl7_msgs.helpers import get_col_names
+from tidy_hl7_msgs.main import tidy_segs
+from tidy_hl7_msgs.readers import read_msgs
+
+MANIFEST = 'manifest.json'
+
+def get_partition_id(path):
+    ''' Stable identifier of a partition, from its file path
+
+    Parameters
+    ----------
+    path : string or path of file
+
+    Returns
+    -------
+    String
+    '''
+    path = os.path.abspath(path)
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+    return "{name}-{digest}".format(name=os.path.basename(path), digest=digest)
+
+def hash_keys(keys):
+    ''' Hash message IDs to sorted 64-bit integers
+
+    Hashes are stable across processes and runs, unlike hash().
+
+    Parameters
+    ----------
+    keys : iterable(string) of message IDs
+
+    Returns
+    -------
+    Sorted numpy array of uint64
+    '''
+    hashes = [
+        int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+        for key in keys
+    ]
+    return np.sort(np.array(hashes, dtype=np.uint64))
+
+def get_file_stamp(path):
+    ''' Size and modification time of a file, to detect changed partitions '''
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def read_manifest(out_dir):
+    ''' Read the manifest of completed partitions
+
+    Parameters
+    ----------
+    out_dir : string or path of output directory
+
+    Returns
+    -------
+    Dictionary, empty if no partitions have been completed
+    '''
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def write_manifest(out_dir, manifest):
+    ''' Write the manifest, replacing the previous one atomically '''
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def process_partition(path, out_dir, msg_id_locs, report_locs, tidy_kwargs):
+    ''' Tidy the messages of one file and write its output and key summary
+
+    Parameters
+    ----------
+    path : string or path of file
+    out_dir : string or path of output directory
+    msg_id_locs : list or dict, see tidy_segs
+    report_locs : list or dict, see tidy_segs
+    tidy_kwargs : dict of other tidy_segs arguments
+
+    Returns
+    -------
+    Dictionary of partition attributes, to be recorded in the manifest; a
+    file without messages satisfying msg_filter is an empty partition
+    '''
+    part_id = get_partition_id(path)
+    stamp = get_file_stamp(path)
+    msgs = read_msgs(path)
+    try:
+        df = tidy_segs(msg_id_locs, report_locs, msgs, **tidy_kwargs)
+    except ValueError as err:
+        if str(err) != NO_MATCHES:
+            raise
+        df = pd.DataFrame(columns=get_col_names(msg_id_locs), dtype=object)
+
+    id_cols = df[get_col_names(msg_id_locs)].drop_duplicates()
+    keys = hash_keys(",".join(row) for row in id_cols.astype(str).itertuples(index=False))
+
+    output = part_id + '.pkl'
+    keys_file = part_id + '.keys.npy'
+
+    # write to temporary files first so partial outputs are never recorded
+    df.to_pickle(os.path.join(out_dir, output + '.tmp'), compression=None)
+    os.replace(os.path.join(out_dir, output + '.tmp'), os.path.join(out_dir, output))
+    with open(os.path.join(out_dir, keys_file + '.tmp'), 'wb') as file:
+        np.save(file, keys)
+    os.replace(os.path.join(out_dir, keys_file + '.tmp'), os.path.join(out_dir, keys_file))
+
+    return dict(
+        stamp,
+        part_id=part_id,
+        path=os.path.abspath(path),
+        output=output,
+        keys=keys_file,
+        n_msgs=len(keys),
+        n_rows=len(df),
+    )
+
+def check_keys(out_dir, manifest):
+    ''' Check message IDs are unique across partitions
+
+    Only the per-partition key summaries are loaded, not the outputs.
+
+    Parameters
+    ----------
+    out_dir : string or path of output directory
+    manifest : dict
+
+    Raises
+    ------
+    RuntimeError if message IDs are not unique across partitions
+    '''
+    part_ids = sorted(manifest.get('partitions', {}))
+    if not part_ids:
+        return
+
+    keys = [
+        np.load(os.path.join(out_dir, manifest['partitions'][part_id]['keys']))
+        for part_id in part_ids
+    ]
+    owners = np.repeat(np.arange(len(keys)), [len(part_keys) for part_keys in keys])
+    keys = np.concatenate(keys)
+
+    order = np.argsort(keys, kind='stable')
+    keys, owners = keys[order], owners[order]
+    is_dup = keys[1:] == keys[:-1]
+
+    if is_dup.any():
+        dup_owners = np.unique(np.concatenate([owners[1:][is_dup], owners[:-1][is_dup]]))
+        raise RuntimeError(
+            "Message IDs are not unique across partitions: {parts}".format(
+                parts=", ".join(part_ids[i] for i in dup_owners)
+            )
+        )
+
+def hash_code(code):
+    ''' Digest of a function's bytecode and constants, including those of
+    nested functions '''
+    consts = [
+        hash_code(const) if hasattr(const, 'co_code') else repr(const)
+        for const in code.co_consts
+    ]
+    digest = hashlib.blake2b(code.co_code, digest_size=8)
+    digest.update(repr(consts).encode('utf-8'))
+    return digest.hexdigest()
+
+def to_spec_val(val):
+    ''' JSON-able form of an argument, to compare arguments across runs
+
+    Sets are sorted. Functions are recorded by module and qualified name,
+    along with a digest of their code and the values they close over, so
+    functions compare equal only if they compute the same thing (ex.
+    prefix('2017') and prefix('2018') differ). Values without a stable
+    form (ex. objects without their own repr) never compare equal across
+    runs.
+
+    Examples
+    --------
+    >>> to_spec_val({'MSH.4.2': {'B', 'A'}, 'MSH.7': prefix('2017')})
+    {'MSH.4.2': ['A', 'B'],
+     'MSH.7': {'function': 'tidy_hl7_msgs.filters.prefix.<locals>.predicate',
+               'code': '...', 'closure': ['2017'], 'defaults': []}}
+    '''
+    if isinstance(val, dict):
+        return {str(k): to_spec_val(v) for k, v in val.items()}
+    if isinstance(val, (list, tuple)):
+        return [to_spec_val(v) for v in val]
+    if isinstance(val, (set, frozenset)):
+        return sorted(to_spec_val(v) for v in val)
+    if callable(val) and hasattr(val, '__code__'):
+        return {
+            'function': "{module}.{name}".format(
+                module=val.__module__, name=val.__qualname__
+            ),
+            'code': hash_code(val.__code__),
+            'closure': [to_spec_val(cell.cell_contents) for cell in val.__closure__ or []],
+            'defaults': to_spec_val(val.__defaults__ or []),
+        }
+    if val is None or isinstance(val, (str, int, float, bool)):
+        return val
+    return repr(val)
+
+def run_partitions(paths, out_dir, msg_id_locs, report_locs, n_workers=None,
+                   **tidy_kwargs):
+    ''' Tidy HL7 message files as resumable partitions
+
+    Each file is a partition, tidied on its own by tidy_segs in parallel
+    worker processes. Each partition's output is written to the output
+    directory as a pickled dataframe, along with a summary of its hashed
+    message IDs, and is recorded in a manifest as it completes. Re-running
+    with the same output directory skips partitions already completed, unless
+    their file has changed since.
+
+    Message IDs are de-duplicated within, but not across, partitions. Their
+    uniqueness across partitions is checked from the key summaries.
+
+    Parameters
+    ----------
+    paths : list(string or path) of HL7 message files
+    out_dir : string or path of output directory, created if needed
+    msg_id_locs : list or dict, see tidy_segs
+    report_locs : list or dict, see tidy_segs
+    n_workers : int, optional
+
+        Number of worker processes; defaults to the number of CPUs. If 1,
+        partitions are processed in this process.
+
+    **tidy_kwargs : other tidy_segs arguments, which must be picklable
+        unless n_workers is 1; they are recorded in the manifest with the
+        locations (see to_spec_val)
+
+    Returns
+    -------
+    List(string) of output paths, one per file in the order of paths
+
+    Raises
+    ------
+    ValueError if output is given, since partitions are written as
+        dataframes
+    ValueError if the output directory holds partitions for other locations
+        or options
+    RuntimeError if any partition fails; completed partitions are kept
+    RuntimeError if message IDs are not unique across partitions
+
+    Examples
+    --------
+    >>> outputs = run_partitions(paths, 'out', ['MSH.7', 'PID.3.1'], ['DG1.3.1'])
+    >>> df = read_partitions('out')
+    '''
+    if 'output' in tidy_kwargs:
+        raise ValueError("Partitions are written as dataframes; output is not supported")
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    spec = to_spec_val(dict(tidy_kwargs, msg_id_locs=msg_id_locs, report_locs=report_locs))
+    manifest = read_manifest(out_dir)
+    if manifest and manifest['spec'] != json.loads(json.dumps(spec)):
+        diffs = sorted(
+            k for k in set(spec) | set(manifest['spec'])
+            if json.loads(json.dumps(spec.get(k))) != manifest['spec'].get(k)
+        )
+        raise ValueError(
+            "Output directory holds partitions for other locations or options: "
+            + ", ".join(diffs)
+        )
+    manifest = {'spec': spec, 'partitions': manifest.get('partitions', {})}
+
+    def is_done(path):
+        part = manifest['partitions'].get(get_partition_id(path))
+        return part is not None and all(
+            part[k] == v for k, v in get_file_stamp(path).items()
+        )
+
+    todo = [path for path in paths if not is_done(path)]
+    failed = {}
+
+    def record(part):
+        manifest['partitions'][part['part_id']] = part
+        write_manifest(out_dir, manifest)
+
+    if n_workers == 1:
+        for path in todo:
+            try:
+                record(process_partition(path, out_dir, msg_id_locs, report_locs, tidy_kwargs))
+            except Exception as err: # pylint: disable=broad-except
+                failed[path] = err
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(
+                    process_partition, path, out_dir, msg_id_locs, report_locs, tidy_kwargs
+                ): path
+                for path in todo
+            }
+            for future in as_completed(futures):
+                try:
+                    record(future.result())
+                except Exception as err: # pylint: disable=broad-except
+                    failed[futures[future]] = err
+
+    if failed:
+        raise RuntimeError(
+            "Partitions failed: {errs}".format(
+                errs="; ".join(
+                    "{path}: {err!r}".format(path=path, err=err)
+                    for path, err in failed.items()
+                )
+            )
+        )
+
+    check_keys(out_dir, manifest)
+
+    return [
+        os.path.join(out_dir, manifest['partitions'][get_partition_id(path)]['output'])
+        for path in paths
+    ]
+
+def read_partitions(out_dir):
+    ''' Read and concatenate the outputs of completed partitions
+
+    Parameters
+    ----------
+    out_dir : string or path of output directory
+
+    Returns
+    -------
+    Dataframe, with partitions in the order of their file paths
+    '''
+    parts = read_manifest(out_dir).get('partitions', {})
+    dfs = [
+        pd.read_pickle(os.path.join(out_dir, part['output']), compression=None)
+        for part in sorted(parts.values(), key=lambda part: part['path'])
+    ]
+
+    # empty partitions (without messages satisfying the filter) only hold
+    # ID columns
+    return pd.concat([df for df in dfs if len(df)] or dfs[:1], ignore_index=True)
@@ -0,0 +1,268 @@
+'''
+Corpus profiler
+'''
+
+import math
+import hashlib
+from collections import Counter
+import numpy as np
+import pandas as pd
+from tidy_hl7_msgs.parsers import parse_loc_txt
+
+class HyperLogLog:
+    ''' Approximate count of distinct strings in fixed memory
+
+    Uses 2 ** precision one-byte registers, with a relative standard error
+    of about 1.04 / sqrt(2 ** precision) (1.6% for the default precision).
+
+    Parameters
+    ----------
+    precision : int, default 12
+
+    Examples
+    --------
+    >>> hll = HyperLogLog()
+    >>> for val in ['a', 'b', 'a']:
+    ...     hll.add(val)
+    >>> round(hll.count())
+    2
+    '''
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, val):
+        ''' Add a string '''
+        digest = hashlib.blake2b(val.encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+
+        n_bits = 64 - self.precision
+        idx = hashed >> n_bits
+        rank = n_bits - (hashed & ((1 << n_bits) - 1)).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self):
+        ''' Estimated number of distinct strings added '''
+        n_regs = len(self.registers)
+        registers = np.frombuffer(bytes(self.registers), dtype=np.uint8)
+        alpha = 0.7213 / (1 + 1.079 / n_regs)
+        estimate = alpha * n_regs ** 2 / np.ldexp(1.0, -registers.astype(int)).sum()
+
+        # linear counting is more accurate for small counts
+        n_zeros = int((registers == 0).sum())
+        if estimate <= 2.5 * n_regs and n_zeros:
+            estimate = n_regs * math.log(n_regs / n_zeros)
+        return estimate
+
+def get_loc_key(loc_txt):
+    ''' Key of a location in a profile: segment name, index of the field in
+    the split segment, and component number (0 for the entire field)
+
+    Parameters
+    ----------
+    loc_txt : string of location
+
+    Returns
+    -------
+    Tuple(string, int, int)
+
+    Raises
+    ------
+    ValueError if location is a wildcard
+
+    Examples
+    --------
+    >>> get_loc_key('PID.3.1')
+    ('PID', 3, 1)
+    >>> get_loc_key('MSH.7')
+    ('MSH', 6, 0)
+    '''
+    loc = parse_loc_txt(loc_txt)
+    if loc.get('wildcard'):
+        raise ValueError("Wildcard locations cannot be profiled: " + loc_txt)
+    return (loc['seg'], loc['field'], loc['comp'] + 1 if loc['depth'] == 3 else 0)
+
+def get_loc_txt(key):
+    ''' Location of a key in a profile, see get_loc_key
+
+    Examples
+    --------
+    >>> get_loc_txt(('MSH', 6, 0))
+    'MSH.7'
+    '''
+    seg, field, comp = key
+    loc_txt = "{seg}.{field}".format(seg=seg, field=field + (seg == 'MSH'))
+    return loc_txt + ".{comp}".format(comp=comp) if comp else loc_txt
+
+class Profiler:
+    ''' Single-pass profile of the fields and components of HL7 messages
+
+    Messages are walked one at a time, so memory is bounded by the number of
+    distinct locations (2 ** precision bytes each for distinct counts), not
+    by the number of messages. Segments are the newline-terminated lines of
+    a message, named by the text before the first field separator (leading
+    spaces or tabs are dropped).
+
+    Parameters
+    ----------
+    id_locs : list(list(string)), optional
+
+        Candidate message ID locations, each a list of locations that taken
+        together would identify messages (see tidy_segs)
+
+    precision : int, default 12
+
+        Precision of distinct counts, see HyperLogLog
+
+    Examples
+    --------
+    >>> profiler = Profiler(id_locs=[['MSH.10'], ['MSH.7', 'PID.3.1']])
+    >>> for msg in iter_file_msgs('2017-05.hl7.gz'):
+    ...     profiler.update(msg)
+    >>> profiler.to_df()
+    >>> profiler.ids_to_df()
+    '''
+    def __init__(self, id_locs=None, precision=12):
+        self.precision = precision
+        self.n_msgs = 0
+        self.locs = {}
+        self.seg_msgs = Counter()
+        self.seg_segs = Counter()
+        self.max_reps = Counter()
+
+        self.id_locs = [list(locs) for locs in id_locs or []]
+        self.id_keys = [[get_loc_key(loc_txt) for loc_txt in locs] for locs in self.id_locs]
+        self.id_complete = [0] * len(self.id_locs)
+        self.id_hlls = [HyperLogLog(precision) for _ in self.id_locs]
+        self.id_msg_hlls = [HyperLogLog(precision) for _ in self.id_locs]
+
+    def add_val(self, key, val, id_vals):
+        ''' Count a value at a location '''
+        stats = self.locs.get(key)
+        if stats is None:
+            stats = self.locs[key] = [0, HyperLogLog(self.precision)]
+        if val:
+            stats[0] += 1
+            stats[1].add(val)
+        if key in id_vals:
+            id_vals[key].append(val)
+
+    def update(self, msg):
+        ''' Profile a message
+
+        Parameters
+        ----------
+        msg : string of HL7 v2 message
+        '''
+        field_sep, comp_sep = msg[3:5]
+        id_vals = {key: [] for keys in self.id_keys for key in keys}
+        reps = Counter()
+
+        for line in msg.split('\n')[:-1]:
+            seg_split = line.split(field_sep)
+            seg = seg_split[0].lstrip(' \t')
+            if len(seg_split) < 2 or not seg:
+                continue
+            reps[seg] += 1
+
+            for field, val in enumerate(seg_split[1:], 1):
+                self.add_val((seg, field, 0), val, id_vals)
+
+                # encoding characters are not split into components
+                if seg == 'MSH' and field == 1:
+                    continue
+                for comp, comp_val in enumerate(val.split(comp_sep), 1):
+                    self.add_val((seg, field, comp), comp_val, id_vals)
+
+        self.n_msgs += 1
+        for seg, n_reps in reps.items():
+            self.seg_msgs[seg] += 1
+            self.seg_segs[seg] += n_reps
+            self.max_reps[seg] = max(self.max_reps[seg], n_reps)
+
+        for i, keys in enumerate(self.id_keys):
+            vals = [id_vals[key] for key in keys]
+            if all(len(key_vals) == 1 and key_vals[0] for key_vals in vals):
+                self.id_complete[i] += 1
+                self.id_hlls[i].add(",".join(key_vals[0] for key_vals in vals))
+                self.id_msg_hlls[i].add(msg)
+
+    def to_df(self):
+        ''' Profile of each location
+
+        Returns
+        -------
+        Dataframe with a row per location, in the order first seen, and
+        columns: 'loc', 'seg_rate' (share of messages with the segment),
+        'fill_rate' (share of segments with a value at the location),
+        'max_reps' (greatest number of segments in a message) and 'distinct'
+        (estimated number of distinct values)
+        '''
+        rows = [
+            [
+                get_loc_txt(key),
+                self.seg_msgs[key[0]] / self.n_msgs,
+                n_vals / self.seg_segs[key[0]],
+                self.max_reps[key[0]],
+                round(hll.count()),
+            ]
+            for key, (n_vals, hll) in self.locs.items()
+        ]
+        return pd.DataFrame(
+            rows, columns=['loc', 'seg_rate', 'fill_rate', 'max_reps', 'distinct']
+        )
+
+    def ids_to_df(self):
+        ''' Profile of each candidate message ID
+
+        Returns
+        -------
+        Dataframe with a row per candidate and columns: 'id_locs' (the
+        locations, comma separated), 'complete_rate' (share of messages with
+        one value at each location), 'distinct' (estimated number of
+        distinct IDs) and 'uniqueness' (estimated number of distinct IDs per
+        distinct message with an ID, where 1 means IDs are unique)
+        '''
+        rows = []
+        for locs, n_complete, hll, msg_hll in zip(
+                self.id_locs, self.id_complete, self.id_hlls, self.id_msg_hlls):
+            n_distinct, n_msgs = hll.count(), msg_hll.count()
+            rows.append([
+                ",".join(locs),
+                n_complete / self.n_msgs if self.n_msgs else np.nan,
+                round(n_distinct),
+                min(n_distinct / n_msgs, 1.0) if n_complete else np.nan,
+            ])
+        return pd.DataFrame(
+            rows, columns=['id_locs', 'complete_rate', 'distinct', 'uniqueness']
+        )
+
+def profile_msgs(msgs, id_locs=None, precision=12):
+    ''' Profile HL7 messages in a single pass, see Profiler
+
+    Parameters
+    ----------
+    msgs : iterable(string) of HL7 v2 messages (ex. readers.iter_file_msgs)
+    id_locs : list(list(string)), optional, candidate message ID locations
+    precision : int, default 12
+
+    Returns
+    -------
+    Profiler
+
+    Examples
+    --------
+    >>> profile = profile_msgs(msgs, id_locs=[['MSH.7', 'PID.3.1']])
+    >>> profile.to_df()
+           loc  seg_rate  fill_rate  max_reps  distinct
+    0    MSH.2       1.0        1.0         1         1
+    ...
+    >>> profile.ids_to_df()
+             id_locs  complete_rate  distinct  uniqueness
+    0  MSH.7,PID.3.1            1.0         3         1.0
+    '''
+    profiler = Profiler(id_locs, precision)
+    for msg in msgs:
+        profiler.update(msg)
+    return profiler
@@ -0,0 +1,188 @@
+'''
+Readers
+'''
+
+import io
+import os
+import re
+import bz2
+import gzip
+import lzma
+import zipfile
+import itertools
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+MSG_START = re.compile('^[ \\t]*(?=MSH\\W)', re.MULTILINE)
+MSG_START_BYTES = re.compile(b'^[ \\t]*(?=MSH\\W)', re.MULTILINE)
+
+CHUNK_SIZE = 1 << 20
+
+OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+def get_msg_bounds(txt):
+    ''' Start and end positions of HL7 messages in text, see split_msgs
+
+    Parameters
+    ----------
+    txt : string, or bytes-like of UTF-8 encoded text
+
+    Returns
+    -------
+    Tuple of lists: message start positions and message end positions
+    '''
+    msg_start = MSG_START if isinstance(txt, str) else MSG_START_BYTES
+    matches = list(msg_start.finditer(txt))
+    starts = [match.end() for match in matches]
+    ends = [match.start() for match in matches[1:]] + [len(txt)]
+    return starts, ends
+
+def split_msgs(txt):
+    ''' Split text into HL7 messages
+
+    A message begins at each line beginning with an MSH segment (leading
+    spaces or tabs are dropped) and runs to the beginning of the next
+    message, including its trailing newline. Text before the first MSH
+    segment is dropped.
+
+    Parameters
+    ----------
+    txt : string
+
+    Returns
+    -------
+    List(string)
+
+    Examples
+    --------
+    >>> split_msgs('MSH|^~\\\\&|A\\nPID|1\\nMSH|^~\\\\&|B\\nPID|2\\n')
+    ['MSH|^~\\\\&|A\\nPID|1\\n', 'MSH|^~\\\\&|B\\nPID|2\\n']
+    '''
+    return [txt[start:end] for start, end in zip(*get_msg_bounds(txt))]
+
+def iter_msgs(file, chunk_size=CHUNK_SIZE):
+    ''' Stream HL7 messages from a text file, see split_msgs
+
+    Parameters
+    ----------
+    file : text file object
+    chunk_size : int, number of characters read at a time
+
+    Yields
+    ------
+    String of each message
+    '''
+    buf = ''
+    for chunk in iter(lambda: file.read(chunk_size), ''):
+        buf += chunk
+        starts, ends = get_msg_bounds(buf)
+
+        # last message may continue in the next chunk
+        for start, end in zip(starts[:-1], ends[:-1]):
+            yield buf[start:end]
+
+        if starts:
+            buf = buf[starts[-1]:]
+        else:
+            buf = buf[buf.rfind('\n') + 1:]
+
+    yield from split_msgs(buf)
+
+def iter_file_msgs(path, encoding='utf-8'):
+    ''' Stream HL7 messages from a file, decompressing it if needed
+
+    Files ending in '.gz', '.bz2' or '.xz' are decompressed as they are read.
+    Each file of a '.zip' archive is read in turn.
+
+    Parameters
+    ----------
+    path : string or path of file
+    encoding : string, default 'utf-8'
+
+    Yields
+    ------
+    String of each message
+    '''
+    ext = os.path.splitext(path)[1].lower()
+
+    # newline='' keeps segment terminators as they are in the file
+    if ext == '.zip':
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield from iter_msgs(
+                        io.TextIOWrapper(member, encoding=encoding, newline='')
+                    )
+    else:
+        opener = OPENERS.get(ext, open)
+        with opener(path, 'rt', encoding=encoding, newline='') as file:
+            yield from iter_msgs(file)
+
+def read_msgs(path, encoding='utf-8'):
+    ''' Read HL7 messages from a file, decompressing it if needed
+
+    Parameters
+    ----------
+    path : string or path of file, see iter_file_msgs
+    encoding : string, default 'utf-8'
+
+    Returns
+    -------
+    List(string), see split_msgs
+    '''
+    return list(iter_file_msgs(path, encoding))
+
+def iter_files_msgs(paths, encoding='utf-8', n_workers=None):
+    ''' Stream HL7 messages from files, decompressing them concurrently
+
+    Each file is read and decompressed in a worker process, and its
+    messages are yielded as soon as it and the files before it are read.
+    At most n_workers files are read ahead, so only their messages are held
+    in memory, not those of every file.
+
+    Parameters
+    ----------
+    paths : list(string or path) of files, see iter_file_msgs
+    encoding : string, default 'utf-8'
+    n_workers : int, optional
+
+        Number of worker processes; defaults to the number of CPUs. If 1,
+        files are streamed in this process, one message at a time.
+
+    Yields
+    ------
+    String of each message, in the order of paths
+
+    Examples
+    --------
+    >>> msgs = iter_files_msgs(['2017-05.hl7.gz', '2017-06.hl7.bz2', '2017-07.zip'])
+    >>> chunks = tidy_sorted(id_locs, report_locs, msgs)
+    '''
+    if n_workers == 1:
+        for path in paths:
+            yield from iter_file_msgs(path, encoding)
+        return
+
+    n_workers = n_workers or os.cpu_count() or 1
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = collections.deque(
+            executor.submit(read_msgs, path, encoding)
+            for path in itertools.islice(paths, n_workers)
+        )
+        while futures:
+            msgs = futures.popleft().result()
+
+            # read the next file while this one is consumed
+            for path in itertools.islice(paths, 1):
+                futures.append(executor.submit(read_msgs, path, encoding))
+            yield from msgs
+
+            # free this file's messages before waiting for the next file
+            del msgs
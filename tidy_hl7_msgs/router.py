@@ -0,0 +1,99 @@
+'''
+Routing of HL7 messages by message type
+'''
+
+from tidy_hl7_msgs.main import tidy_segs
+from tidy_hl7_msgs.parsers import parse_msgs, get_seps
+
+def parse_msg_types(msgs, engine='python'):
+    ''' Message type and trigger event of each message
+
+    MSH.9 is parsed once for all messages, and split on each message's
+    component separator.
+
+    Parameters
+    ----------
+    msgs : list(string) of HL7 v2 messages
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+    Returns
+    -------
+    List(string) of message type and trigger event joined by '^' (ex.
+    'ADT^A08'), or None if MSH.9 is missing
+
+    Examples
+    --------
+    >>> parse_msg_types([msg_adt, msg_oru])
+    ['ADT^A08', 'ORU^R01']
+    '''
+    msg_types = []
+    for vals, seps in zip(parse_msgs('MSH.9', msgs, engine), get_seps(msgs)):
+        if isinstance(vals[0], str) and vals[0] != 'no_seg':
+            msg_types.append("^".join(vals[0].split(seps[1])[:2]))
+        else:
+            msg_types.append(None)
+    return msg_types
+
+def route_msgs(routes, msgs, engine='python'):
+    ''' Tidy messages of each message type with its own locations
+
+    Message types are parsed once for all messages (see parse_msg_types),
+    and each message is dispatched to the route of its message type and
+    trigger event (ex. 'ADT^A08') or, failing that, of its message type (ex.
+    'ADT'). Messages without a route are dropped.
+
+    Parameters
+    ----------
+    routes : dict
+
+        Keys are message types, with or without trigger events, and values
+        are dicts of keyword arguments of tidy_segs: 'msg_id_locs',
+        'report_locs' and any options (ex. 'wide')
+
+    msgs : iterable(string) of HL7 v2 messages
+    engine : string, one of 'python' (default), 'numpy' or 'parallel'
+
+        Parsing engine of message types, and of routes that do not set one
+
+    Returns
+    -------
+    Dict of route keys and tidy output (see tidy_segs), for routes with
+    messages
+
+    Raises
+    ------
+    ValueError if a route lacks message ID or report locations
+
+    Examples
+    --------
+    >>> route_msgs({
+    ...     'ADT': {'msg_id_locs': ['MSH.10'], 'report_locs': ['DG1.3.1']},
+    ...     'ORU^R01': {'msg_id_locs': ['MSH.10'], 'report_locs': ['OBX.3.1', 'OBX.5']},
+    ... }, msgs)
+    {'ADT': ..., 'ORU^R01': ...}
+    '''
+    for key, spec in routes.items():
+        if not {'msg_id_locs', 'report_locs'} <= set(spec):
+            raise ValueError(
+                "Route requires message ID and report locations: {key}".format(key=key)
+            )
+
+    msgs = list(msgs)
+    routed = {key: [] for key in routes}
+    for msg, msg_type in zip(msgs, parse_msg_types(msgs, engine)):
+        if msg_type is None:
+            continue
+        key = msg_type if msg_type in routed else msg_type.split("^")[0]
+        if key in routed:
+            routed[key].append(msg)
+
+    tidied = {}
+    for key, spec in routes.items():
+        if not routed[key]:
+            continue
+        kwargs = {'engine': engine}
+        kwargs.update(spec)
+        tidied[key] = tidy_segs(
+            kwargs.pop('msg_id_locs'), kwargs.pop('report_locs'), routed[key], **kwargs
+        )
+    return tidied
@@ -0,0 +1,77 @@
+'''
+Head and sample of HL7 messages
+'''
+
+import math
+import random
+import itertools
+
+def head_msgs(msgs, n_msgs):
+    ''' First distinct messages, consuming no more input than needed
+
+    Parameters
+    ----------
+    msgs : iterable(string) of HL7 v2 messages
+    n_msgs : int
+
+    Returns
+    -------
+    List(string) of up to n_msgs distinct messages, in input order
+
+    Examples
+    --------
+    >>> head_msgs(['a', 'a', 'b', 'c'], 2)
+    ['a', 'b']
+    '''
+    head = {}
+    for msg in msgs:
+        head[msg] = None
+        if len(head) == n_msgs:
+            break
+    return list(head)
+
+def get_uniform(rng):
+    ''' Random number in (0, 1) '''
+    u = 0.0
+    while u == 0.0:
+        u = rng.random()
+    return u
+
+def sample_msgs(msgs, n_msgs, seed=None):
+    ''' Random sample of messages, by reservoir sampling
+
+    Each message of the input is equally likely to be sampled. The input is
+    consumed once, skipping over messages between replacements of the
+    reservoir (Li's algorithm L), and only the reservoir is held in memory.
+    Duplicates in the reservoir are dropped, so fewer than n_msgs messages
+    are returned if the input repeats messages.
+
+    Parameters
+    ----------
+    msgs : iterable(string) of HL7 v2 messages
+    n_msgs : int
+    seed : int, optional, seed of the random number generator
+
+    Returns
+    -------
+    List(string) of up to n_msgs distinct messages
+
+    Examples
+    --------
+    >>> sample_msgs(msgs, 1000, seed=42)
+    '''
+    rng = random.Random(seed)
+    msgs = iter(msgs)
+    reservoir = list(itertools.islice(msgs, n_msgs))
+
+    if len(reservoir) == n_msgs:
+        weight = math.exp(math.log(get_uniform(rng)) / n_msgs)
+        while True:
+            skip = math.floor(math.log(get_uniform(rng)) / math.log1p(-weight))
+            msg = next(itertools.islice(msgs, skip, None), None)
+            if msg is None:
+                break
+            reservoir[rng.randrange(n_msgs)] = msg
+            weight *= math.exp(math.log(get_uniform(rng)) / n_msgs)
+
+    return list(dict.fromkeys(reservoir))
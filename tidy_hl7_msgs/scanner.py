@@ -0,0 +1,374 @@
+'''
+NumPy byte-level scanner
+'''
+
+import numpy as np
+
+NEWLINE = ord('\n')
+
+class MsgBatch:
+    ''' Batch of HL7 messages packed into one contiguous byte buffer
+
+    Segment terminators and field/component separators are located for the
+    whole batch at once with vectorized NumPy operations.  Locations are then
+    resolved by index arithmetic on these positions, and strings are only
+    materialized for the extracted values.
+
+    Results are identical to those of the Python parser (see
+    parsers.get_parser): a segment runs from its name to the next newline,
+    and each message uses the separators found at its 4th and 5th characters.
+
+    Parameters
+    ----------
+    msgs : list(string) of HL7 v2 messages
+
+    Raises
+    ------
+    ValueError if a message is too short to hold its separators
+    ValueError if a message's separators are not ASCII
+
+    Examples
+    --------
+    >>> batch = MsgBatch([msg1, msg2])
+    >>> batch.parse(parse_loc_txt('AL1.3.1'))
+    [['1545'], ['00000741']]
+    '''
+    def __init__(self, msgs):
+        self.msgs = list(msgs)
+        encoded = [msg.encode('utf-8') for msg in self.msgs]
+        lens = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+
+        self.raw = b''.join(encoded)
+        self._scan(np.frombuffer(self.raw, dtype=np.uint8), lens)
+
+    @classmethod
+    def from_buffer(cls, buf, lens):
+        ''' Batch of messages already encoded into a buffer, without copying
+
+        Parameters
+        ----------
+        buf : numpy array(uint8) of UTF-8 encoded messages, back to back
+        lens : numpy array(int64) of the encoded length of each message
+
+        Returns
+        -------
+        MsgBatch
+        '''
+        batch = cls.__new__(cls)
+        batch.msgs = None
+        batch.raw = buf.data
+        batch._scan(buf, lens)
+        return batch
+
+    def _scan(self, buf, lens):
+        ''' Locate newlines and field separators '''
+        self.buf = buf
+        self.lens = lens
+        self.ends = np.cumsum(lens)
+        self.starts = self.ends - lens
+
+        # segment name and separators must be single bytes
+        if (lens < 5).any() or any((buf[self.starts + i] >= 128).any() for i in range(5)):
+            raise ValueError(
+                "Messages must begin with a segment name and ASCII separators"
+            )
+
+        self.field_seps = buf[self.starts + 3]
+        self.comp_seps = buf[self.starts + 4]
+
+        self.newlines = np.flatnonzero(buf == NEWLINE)
+        self.field_sep_pos = self._find_seps(self.field_seps)
+        self._comp_sep_pos = None
+        self._segs = {}
+
+    def __len__(self):
+        return len(self.lens)
+
+    def __iter__(self):
+        if self.msgs is not None:
+            return iter(self.msgs)
+        return (
+            str(self.raw[start:end], 'utf-8')
+            for start, end in zip(self.starts.tolist(), self.ends.tolist())
+        )
+
+    def get_seps(self):
+        ''' Field and component separators of each message '''
+        return [
+            chr(field_sep) + chr(comp_sep)
+            for field_sep, comp_sep in zip(self.field_seps.tolist(), self.comp_seps.tolist())
+        ]
+
+    def get_raw(self):
+        ''' Bytes-like of the encoded messages, which located positions index '''
+        return self.raw
+
+    def _find_seps(self, seps):
+        ''' Positions of each message's separator in the buffer '''
+        if not seps.size:
+            return np.empty(0, dtype=np.int64)
+        if (seps == seps[0]).all():
+            return np.flatnonzero(self.buf == seps[0])
+        return np.flatnonzero(self.buf == np.repeat(seps, self.lens))
+
+    @property
+    def comp_sep_pos(self):
+        ''' Positions of component separators, found on first use '''
+        if self._comp_sep_pos is None:
+            self._comp_sep_pos = self._find_seps(self.comp_seps)
+        return self._comp_sep_pos
+
+    def msg_of(self, pos):
+        ''' Index of the message holding each buffer position '''
+        return np.searchsorted(self.ends, pos, side='right')
+
+    def find_segs(self, seg):
+        ''' Locate all occurrences of a segment
+
+        Parameters
+        ----------
+        seg : string of segment name
+
+        Returns
+        -------
+        Tuple of arrays: segment start positions, segment end positions (the
+        terminating newline) and message indices
+        '''
+        if seg in self._segs:
+            return self._segs[seg]
+
+        name = np.frombuffer(seg.encode('utf-8'), dtype=np.uint8)
+        n_bytes = len(self.buf) - len(name)
+
+        cands = np.flatnonzero(self.buf[:max(n_bytes, 0)] == name[0])
+        for i in range(1, len(name)):
+            cands = cands[self.buf[cands + i] == name[i]]
+        cands = cands[self.buf[cands + len(name)] == self.field_seps[self.msg_of(cands)]]
+
+        msg_idx = self.msg_of(cands)
+        line_idx = np.searchsorted(self.newlines, cands)
+
+        # segment must be terminated by a newline within the same message
+        is_terminated = line_idx < len(self.newlines)
+        cands, msg_idx, line_idx = cands[is_terminated], msg_idx[is_terminated], line_idx[is_terminated]
+        seg_ends = self.newlines[line_idx]
+        is_same_msg = seg_ends < self.ends[msg_idx]
+        cands, msg_idx, line_idx = cands[is_same_msg], msg_idx[is_same_msg], line_idx[is_same_msg]
+        seg_ends = seg_ends[is_same_msg]
+
+        # only the first match on a line is a segment
+        is_first = np.ones(len(cands), dtype=bool)
+        is_first[1:] = line_idx[1:] != line_idx[:-1]
+
+        self._segs[seg] = (cands[is_first], seg_ends[is_first], msg_idx[is_first])
+        return self._segs[seg]
+
+    @staticmethod
+    def _split_at(sep_pos, starts, ends, idx):
+        ''' Bounds of the idx-th element when splitting [starts, ends) on sep_pos
+
+        Negative indices count from the last element, as with list indexing.
+        Returns element start positions, end positions and whether the element
+        exists.
+        '''
+        first = np.searchsorted(sep_pos, starts)
+        n_elems = np.searchsorted(sep_pos, ends) - first + 1
+
+        elem = np.full(len(starts), idx) if idx >= 0 else n_elems + idx
+        exists = (elem >= 0) & (elem < n_elems)
+        elem = np.where(exists, elem, 0)
+
+        if not sep_pos.size:
+            return starts, ends, exists
+
+        last = len(sep_pos) - 1
+        elem_starts = np.where(
+            elem == 0, starts, sep_pos[np.clip(first + elem - 1, 0, last)] + 1
+        )
+        elem_ends = np.where(
+            elem == n_elems - 1, ends, sep_pos[np.clip(first + elem, 0, last)]
+        )
+        return elem_starts, elem_ends, exists
+
+    def locate(self, loc):
+        ''' Locate values of all messages at a given location
+
+        Parameters
+        ----------
+        loc : dict of location attributes and values, where a depth of 1
+            locates the entire segment
+
+        Returns
+        -------
+        Tuple of arrays, one element per segment: message indices, value
+        start positions, value end positions and whether the value is present
+        '''
+        seg_starts, seg_ends, msg_idx = self.find_segs(loc['seg'])
+
+        # entire segment
+        if loc['depth'] == 1:
+            return msg_idx, seg_starts, seg_ends, np.ones(len(msg_idx), dtype=bool)
+
+        starts, ends, exists = self._split_at(
+            self.field_sep_pos, seg_starts, seg_ends, loc['field']
+        )
+        if loc['depth'] == 3:
+            starts, ends, comp_exists = self._split_at(
+                self.comp_sep_pos, starts, ends, loc['comp']
+            )
+            exists &= comp_exists
+
+        # if sep present for split but no data (i.e empty string)
+        has_val = exists & (ends > starts)
+
+        return msg_idx, starts, ends, has_val
+
+    def parse(self, loc):
+        ''' Parse all messages at a given location
+
+        Parameters
+        ----------
+        loc : dict of location attributes and values
+
+        Returns
+        -------
+        List(list(string)), as returned by parsers.parse_msgs
+        '''
+        return group_vals(self.get_raw(), len(self), *self.locate(loc))
+
+    def parse_segs(self, segs):
+        ''' Walk messages for segments of several types, in message order
+
+        Parameters
+        ----------
+        segs : list(string) of segment names
+
+        Returns
+        -------
+        List(list(tuple(string, string))), as returned by parsers.walk_segs
+        '''
+        located = [self.locate({'seg': seg, 'depth': 1})[:3] for seg in segs]
+        return group_segs(self.get_raw(), len(self), segs, located)
+
+class BatchView:
+    ''' Messages of a batch at given indices, parsed from the batch's own scan
+
+    Values are located for the whole batch, as by the batch itself, but
+    strings are only materialized for messages of the view.
+
+    Parameters
+    ----------
+    batch : MsgBatch, parallel.SharedBatch, cache.CachedBatch or BatchView
+    idx : list(int) of message indices in the batch, in ascending order
+
+    Examples
+    --------
+    >>> view = BatchView(MsgBatch([msg1, msg2, msg3]), [0, 2])
+    >>> view.parse(parse_loc_txt('MSH.7'))
+    [['20170515104040'], ['20170322123231']]
+    '''
+    def __init__(self, batch, idx):
+        self.batch = batch
+        self.idx = list(idx)
+
+        # index in the view of each message of the batch, or -1 if not kept
+        self.view_idx = np.full(len(batch), -1, dtype=np.int64)
+        self.view_idx[self.idx] = np.arange(len(self.idx))
+
+    def __len__(self):
+        return len(self.idx)
+
+    def __iter__(self):
+        is_kept = (self.view_idx >= 0).tolist()
+        return (msg for msg, keep in zip(self.batch, is_kept) if keep)
+
+    def get_seps(self):
+        ''' Field and component separators of each message '''
+        seps = self.batch.get_seps()
+        return [seps[i] for i in self.idx]
+
+    def get_raw(self):
+        ''' Bytes-like of the encoded messages of the batch '''
+        return self.batch.get_raw()
+
+    def locate(self, loc):
+        ''' Locate values of the messages of the view, see MsgBatch.locate
+
+        Message indices are indices in the view.
+        '''
+        msg_idx, starts, ends, has_val = self.batch.locate(loc)
+        msg_idx = self.view_idx[np.asarray(msg_idx)]
+        is_kept = msg_idx >= 0
+        return (
+            msg_idx[is_kept], np.asarray(starts)[is_kept], np.asarray(ends)[is_kept],
+            np.asarray(has_val)[is_kept].astype(bool)
+        )
+
+    def parse(self, loc):
+        ''' Parse all messages at a given location, see MsgBatch.parse '''
+        return group_vals(self.get_raw(), len(self), *self.locate(loc))
+
+    def parse_segs(self, segs):
+        ''' Walk messages for segments of several types, see MsgBatch.parse_segs '''
+        located = [self.locate({'seg': seg, 'depth': 1})[:3] for seg in segs]
+        return group_segs(self.get_raw(), len(self), segs, located)
+
+def group_vals(raw, n_msgs, msg_idx, starts, ends, has_val):
+    ''' Materialize located values and group them by message
+
+    Parameters
+    ----------
+    raw : bytes-like of UTF-8 encoded messages
+    n_msgs : int
+    msg_idx, starts, ends, has_val : arrays, as returned by MsgBatch.locate
+
+    Returns
+    -------
+    List(list(string)), as returned by parsers.parse_msgs
+    '''
+    data = [[] for _ in range(n_msgs)]
+    for i, start, end, has in zip(
+            msg_idx.tolist(), starts.tolist(), ends.tolist(), has_val.tolist()):
+        data[i].append(str(raw[start:end], 'utf-8') if has else np.nan)
+
+    return [vals if vals else ['no_seg'] for vals in data]
+
+def group_segs(raw, n_msgs, segs, located):
+    ''' Materialize located segments of several types and group them by message
+
+    Parameters
+    ----------
+    raw : bytes-like of UTF-8 encoded messages
+    n_msgs : int
+    segs : list(string) of segment names
+    located : list(tuple(array)) of message indices, segment start positions
+        and segment end positions, one per segment name
+
+    Returns
+    -------
+    List(list(tuple(string, string))), as returned by parsers.walk_segs
+    '''
+    names = np.concatenate(
+        [np.full(len(msg_idx), i) for i, (msg_idx, _, _) in enumerate(located)]
+        + [np.empty(0, dtype=np.int64)]
+    ).astype(np.int64)
+    msg_idx, starts, ends = (
+        np.concatenate([np.asarray(seg_located[i]) for seg_located in located]
+                       + [np.empty(0, dtype=np.int64)]).astype(np.int64)
+        for i in range(3)
+    )
+
+    order = np.argsort(starts, kind='stable')
+    names, msg_idx, starts, ends = names[order], msg_idx[order], starts[order], ends[order]
+
+    # a line holds one segment, the first of any of the names
+    is_first = np.ones(len(starts), dtype=bool)
+    is_first[1:] = ends[1:] != ends[:-1]
+
+    data = [[] for _ in range(n_msgs)]
+    for i, name, start, end in zip(
+            msg_idx[is_first].tolist(), names[is_first].tolist(),
+            starts[is_first].tolist(), ends[is_first].tolist()):
+        data[i].append((segs[name], str(raw[start:end], 'utf-8')))
+
+    return data
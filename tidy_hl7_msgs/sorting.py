@@ -0,0 +1,196 @@
+'''
+External merge sort of tidy output
+'''
+
+import os
+import heapq
+import hashlib
+import pickle
+import tempfile
+import itertools
+from tidy_hl7_msgs.filters import iter_filter_msgs
+from tidy_hl7_msgs.main import tidy_cols
+from tidy_hl7_msgs.outputs import get_builder
+
+BLOCK_ROWS = 10000
+
+def write_run(rows, path):
+    ''' Write sorted rows to a file, in blocks that can be read one at a time
+
+    Parameters
+    ----------
+    rows : list(tuple)
+    path : string or path of file
+    '''
+    with open(path, 'wb') as file:
+        for start in range(0, len(rows), BLOCK_ROWS):
+            pickle.dump(rows[start:start + BLOCK_ROWS], file, pickle.HIGHEST_PROTOCOL)
+
+def read_run(path):
+    ''' Read rows written by write_run, a block at a time
+
+    Parameters
+    ----------
+    path : string or path of file
+
+    Yields
+    ------
+    Tuple of each row
+    '''
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                block = pickle.load(file)
+            except EOFError:
+                return
+            yield from block
+
+def merge_runs(paths, key):
+    ''' Merge sorted runs into a single sorted stream
+
+    Only one block of rows per run is held in memory. Rows with equal keys
+    are yielded in the order of their runs.
+
+    Parameters
+    ----------
+    paths : list(string or path) of files written by write_run
+    key : function of a row, returning its sort key
+
+    Yields
+    ------
+    Tuple of the index of each row's run and the row
+    '''
+    runs = [
+        zip(itertools.repeat(run), read_run(path)) for run, path in enumerate(paths)
+    ]
+    return heapq.merge(*runs, key=lambda item: key(item[1]))
+
+def hash_msg(msg):
+    ''' Digest of a message's contents '''
+    return hashlib.blake2b(msg.encode('utf-8'), digest_size=16).digest()
+
+def get_sort_key(n_ids, seg_idx=None):
+    ''' Sort key of tidy rows, as sorted by tidy_segs
+
+    Parameters
+    ----------
+    n_ids : int, number of message ID columns, which come first
+    seg_idx : int, optional, index of the segment number column
+
+    Returns
+    -------
+    Function of a row, returning its sort key
+    '''
+    if seg_idx is None:
+        return lambda row: (",".join(row[:n_ids]),)
+    return lambda row: (",".join(row[:n_ids]), row[seg_idx])
+
+def tidy_sorted(msg_id_locs, report_locs, msgs, chunk_size=100000, tmp_dir=None,
+                output='pandas', **tidy_kwargs):
+    ''' Tidy HL7 message segments a chunk at a time, in the order of tidy_segs
+
+    Each chunk of messages is tidied and sorted (see tidy_segs), and its rows
+    are spilled to a temporary file. The sorted runs are then merged, so
+    output larger than memory is returned in the same order as tidy_segs.
+    Only one block of rows per run is held in memory while merging.
+
+    Messages are de-duplicated within a chunk by tidy_segs, and across
+    chunks when merging: each row is spilled with a digest of its message,
+    so rows of a message already merged from another chunk are dropped.
+
+    Parameters
+    ----------
+    msg_id_locs : list or dict, see tidy_segs
+    report_locs : list or dict, see tidy_segs
+    msgs : iterable(string) of HL7 v2 messages (ex. readers.iter_file_msgs)
+    chunk_size : int, default 100000
+
+        Number of messages tidied per sorted run, and number of rows per
+        chunk of output
+
+    tmp_dir : string or path, optional
+
+        Directory of temporary files; defaults to the system's
+
+    output : string or function, default 'pandas', see tidy_segs
+    **tidy_kwargs : keyword arguments of tidy_segs, except preserve_order,
+        limit and sample
+
+        Wildcard locations and wide output must return the same columns for
+        every chunk (ex. pass max_reps if wide).
+
+    Yields
+    ------
+    Output of each chunk of rows (ex. a dataframe)
+
+    Raises
+    ------
+    ValueError if preserve_order, limit or sample is given
+    ValueError if chunks of messages return different columns
+    RuntimeError if message IDs are not unique, see parsers.parse_msg_id
+
+    Examples
+    --------
+    >>> chunks = tidy_sorted(id_locs, report_locs, iter_file_msgs('2017.hl7.gz'))
+    >>> for i, df in enumerate(chunks):
+    ...     df.to_csv('tidy_{i}.csv'.format(i=i))
+    '''
+    if {'preserve_order', 'limit', 'sample'} & set(tidy_kwargs):
+        raise ValueError("Sorted output does not support preserve_order, limit or sample")
+
+    build = get_builder(output)
+    msg_filter = tidy_kwargs.pop('msg_filter', None)
+    engine = tidy_kwargs.get('engine', 'python')
+    if msg_filter:
+        msgs = iter_filter_msgs(msg_filter, msgs, engine)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as run_dir:
+        # sorted runs, one per chunk of messages
+        names, paths = None, []
+        msgs = iter(msgs)
+        for chunk in iter(lambda: list(itertools.islice(msgs, chunk_size)), []):
+            cols, msg_ids, msgs_parsed = tidy_cols(
+                msg_id_locs, report_locs, chunk, **tidy_kwargs
+            )
+            if names is None:
+                names = list(cols)
+            elif list(cols) != names:
+                raise ValueError(
+                    "Chunks of messages return different columns; pass max_reps "
+                    "if wide, and avoid wildcard locations"
+                )
+
+            # digest of each row's message, to tell duplicates of a message
+            # from different messages with the same ID when merging; message
+            # IDs are those tidy_cols parsed, so messages are not parsed again
+            digests = dict(zip(msg_ids, map(hash_msg, msgs_parsed)))
+            id_cols = list(cols.values())[:len(msg_id_locs)]
+            row_digests = [digests[",".join(msg_id)] for msg_id in zip(*id_cols)]
+
+            paths.append(os.path.join(run_dir, "{n}.pkl".format(n=len(paths))))
+            write_run(list(zip(*cols.values(), row_digests)), paths[-1])
+
+        if names is None:
+            return
+
+        n_ids = len(msg_id_locs)
+        is_by_seg = not tidy_kwargs.get('wide') and tidy_kwargs.get('parent_seg') is None
+        key = get_sort_key(n_ids, names.index('seg') if is_by_seg else None)
+
+        # merge runs, dropping messages already merged from another run
+        rows, msg_id, msg_run, msg_digest = [], None, None, None
+        for run, row in merge_runs(paths, key):
+            if row[:n_ids] != msg_id:
+                msg_id, msg_run, msg_digest = row[:n_ids], run, row[-1]
+            elif row[-1] != msg_digest:
+                raise RuntimeError("Messages IDs are not unique")
+            elif run != msg_run:
+                continue
+
+            rows.append(row[:-1])
+            if len(rows) == chunk_size:
+                yield build(dict(zip(names, map(list, zip(*rows)))))
+                rows = []
+
+        if rows:
+            yield build(dict(zip(names, map(list, zip(*rows)))))